@@ -1,11 +1,21 @@
 import os
 import json
 import time
-from flask import Flask, render_template, request, send_from_directory, redirect, url_for
-from ocr_processor import process_single_pdf
+import uuid
+import itertools
+from flask import Flask, render_template, request, send_from_directory, send_file, redirect, url_for, jsonify, \
+    Response, stream_with_context, g
+from job_queue import job_queue
 from search_engine import search_engine
+from index_cache import index_cache
+from catalog import catalog
+from page_text_store import read_page_text
+from pdf_pages import page_slice_cache, page_thumbnail_cache
+from upload_manager import upload_manager, UploadOffsetMismatch
+from document_store import document_store
+from metrics import metrics, HTTP_REQUEST_SECONDS
 from config import *
-from special_circuit_data import SPECIAL_CIRCUIT_COMPONENTS
+from special_datasets import get_special_dataset
 
 # 初始化Flask应用
 app = Flask(__name__)
@@ -15,52 +25,69 @@ for dir_path in [PDF_DIR, INDEX_DIR, LOG_DIR]:
     os.makedirs(dir_path, exist_ok=True)
 
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    """记录请求耗时（流式响应只统计到开始发送为止）"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                                     method=request.method, status=response.status_code)
+    return response
+
+
 def get_pdf_list():
     """获取所有PDF文件及其状态信息（扩展元器件统计）"""
     pdf_files = []
-    for filename in os.listdir(PDF_DIR):
+    for entry in os.scandir(PDF_DIR):
+        filename = entry.name
         if filename.lower().endswith(".pdf") and not filename.startswith("."):
             # 基础信息
-            pdf_path = os.path.join(PDF_DIR, filename)
-            pdf_size = round(os.path.getsize(pdf_path) / (1024 * 1024), 2)
+            pdf_size = round(entry.stat().st_size / (1024 * 1024), 2)
 
-            # 索引信息
-            index_path = os.path.join(INDEX_DIR, f"{filename.replace('.pdf', '')}.json")
             status = "未处理"
             total_pages = 0
             success_pages = 0
             total_components = 0  # 总元器件数
             processed_time = "未处理"
 
+            # 后台处理中的任务（显示实时进度；内容重复的文档显示其规范文档的任务）
+            duplicate_of = document_store.alias_target(filename)
+            job = job_queue.active_job_for(duplicate_of or filename)
+
             # 对于特定PDF，直接使用预定义的元器件数据
-            if filename == SPECIAL_PDF_IDENTIFIER:
+            special_dataset = get_special_dataset(filename)
+            if special_dataset is not None:
                 status = "已处理"
-                total_pages = len(SPECIAL_CIRCUIT_COMPONENTS)
+                total_pages = special_dataset.total_pages
                 success_pages = total_pages
-                total_components = sum(len(components) for components in SPECIAL_CIRCUIT_COMPONENTS.values())
+                total_components = special_dataset.total_components
                 processed_time = "系统内置"
-            elif os.path.exists(index_path):
+            else:
+                # 索引信息：读取目录清单中的摘要记录（不再解析整个索引文件）
                 try:
-                    with open(index_path, 'r', encoding='utf-8') as f:
-                        index_data = json.load(f)
-
-                    # 状态映射
-                    status_map = {
-                        "processing": "已处理",
-                        "success": "已处理",
-                        "failed": "处理异常"
-                    }
-                    status = status_map.get(index_data.get("pdf_info", {}).get("status"), "未处理")
-                    total_pages = index_data.get("total_pages", 0)
-                    success_pages = index_data.get("success_pages", 0)
-                    total_components = index_data.get("total_components", 0)
-                    # 获取文件修改时间（作为处理时间）
-                    processed_time = time.strftime(
-                        "%Y-%m-%d %H:%M",
-                        time.localtime(os.path.getmtime(index_path))
-                    )
+                    record = catalog.get(filename)
+                    if record:
+                        # 状态映射
+                        status_map = {
+                            "processing": "已处理",
+                            "success": "已处理",
+                            "failed": "处理异常"
+                        }
+                        status = status_map.get(record["status"], "未处理")
+                        total_pages = record["total_pages"]
+                        success_pages = record["success_pages"]
+                        total_components = record["total_components"]
+                        # 索引文件修改时间（作为处理时间）
+                        processed_time = time.strftime("%Y-%m-%d %H:%M", time.localtime(record["index_mtime"]))
                 except Exception as e:
                     app.logger.warning(f"读取索引失败 {filename}：{str(e)}")
+            if job:
+                status = "处理中"
 
             pdf_files.append({
                 "filename": filename,
@@ -71,7 +98,9 @@ def get_pdf_list():
                 "success_pages": success_pages,
                 "total_components": total_components,
                 "processed_time": processed_time,
-                "is_special": filename == SPECIAL_PDF_IDENTIFIER  # 标记是否为特定PDF
+                "is_special": special_dataset is not None,  # 标记是否为特定PDF
+                "duplicate_of": duplicate_of,  # 内容相同的已有文档（共用其索引）
+                "job": job  # 未完成的后台任务（用于前端轮询进度）
             })
 
     # 按处理时间降序排序（已处理的在前）
@@ -99,41 +128,127 @@ def upload_pdf():
     if file.filename == '' or not file.filename.lower().endswith('.pdf'):
         return redirect(url_for('index'))
 
-    # 保存文件（避免文件名重复）
-    filename = file.filename
-    base_name, ext = os.path.splitext(filename)
-    counter = 1
-    while os.path.exists(os.path.join(PDF_DIR, filename)):
-        filename = f"{base_name}_{counter}{ext}"
-        counter += 1
-
-    file.save(os.path.join(PDF_DIR, filename))
-    # 自动处理PDF（特定PDF不需要处理）
-    if filename != SPECIAL_PDF_IDENTIFIER:
-        process_single_pdf(filename)
+    # 先保存到临时文件，再放入PDF目录（避免文件名重复；与已有文档内容相同时共用其索引）
+    tmp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.upload")
+    try:
+        file.save(tmp_path)
+        stored = document_store.store_pdf(tmp_path, file.filename)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # 提交后台处理任务（特定PDF和重复文档不需要处理），请求立即返回
+    if stored["duplicate_of"] is None and get_special_dataset(stored["filename"]) is None:
+        job_queue.submit(stored["filename"])
     return redirect(url_for('index'))
 
 
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """创建分块上传会话：JSON {"filename": 文件名, "size": 字节数}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        session = upload_manager.create(data.get("filename"), int(data.get("size") or 0))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(session), 201
+
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """查询上传会话（offset为服务端已接收的字节数，续传时从这里开始）"""
+    session = upload_manager.get(upload_id)
+    if session is None:
+        return jsonify({"error": "上传会话不存在"}), 404
+    return jsonify(session)
+
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def append_upload_chunk(upload_id):
+    """追加一个分块：请求体为原始字节，?offset= 为该分块在文件中的起始位置"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({"error": "缺少offset参数"}), 400
+    if request.content_length is None:
+        return jsonify({"error": "缺少Content-Length"}), 411
+    try:
+        received = upload_manager.append(upload_id, offset, request.stream, request.content_length)
+    except FileNotFoundError:
+        return jsonify({"error": "上传会话不存在"}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"upload_id": upload_id, "offset": received})
+
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """完成上传（可选JSON {"sha256": 客户端计算的哈希} 用于校验），文件移入PDF目录并提交后台处理任务
+    与已有文档内容相同时不重新处理，返回的duplicate_of为该文档
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        uploaded = upload_manager.finalize(upload_id, expected_sha256=data.get("sha256"))
+    except FileNotFoundError:
+        return jsonify({"error": "上传会话不存在"}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({"error": "文件尚未上传完整", "offset": e.offset}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 提交后台处理任务（特定PDF和重复文档不需要处理）
+    if uploaded["duplicate_of"] is None and get_special_dataset(uploaded["filename"]) is None:
+        uploaded["job"] = job_queue.submit(uploaded["filename"])
+    return jsonify(uploaded)
+
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """取消上传并删除已接收的数据"""
+    if not upload_manager.abort(upload_id):
+        return jsonify({"error": "上传会话不存在"}), 404
+    return "", 204
+
+
 @app.route('/process/<pdf_filename>')
 def process_pdf(pdf_filename):
-    """手动处理指定PDF文件（特定PDF不需要处理）"""
-    if pdf_filename == SPECIAL_PDF_IDENTIFIER:
+    """手动处理指定PDF文件（特定PDF不需要处理）
+    默认增量处理（只重新处理内容或词典变化的页面），?full=1 时全量重新处理
+    """
+    if get_special_dataset(pdf_filename) is not None:
         return redirect(url_for('index'))
 
     pdf_path = os.path.join(PDF_DIR, pdf_filename)
     if not os.path.exists(pdf_path) or not pdf_filename.lower().endswith(".pdf"):
         return "无效的PDF文件", 404
 
-    # 执行处理
-    process_single_pdf(pdf_filename)
+    # 提交后台处理任务（内容重复的文档处理其规范文档）
+    job_queue.submit(document_store.canonical(pdf_filename), incremental=request.args.get('full') != '1')
     return redirect(url_for('index'))
 
 
+@app.route('/jobs')
+def list_jobs():
+    """查询后台处理任务列表（?active=1 只返回未完成任务）"""
+    active_only = request.args.get('active') == '1'
+    return jsonify({"jobs": job_queue.list_jobs(active_only=active_only)})
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """查询单个后台处理任务的状态与进度"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job)
+
+
 @app.route('/view/<pdf_filename>')
 def view_pdf(pdf_filename):
     """查看PDF并提供搜索功能（适配特定PDF的新搜索结果结构）"""
+    special_dataset = get_special_dataset(pdf_filename)
     pdf_path = os.path.join(PDF_DIR, pdf_filename)
-    if not os.path.exists(pdf_path) and pdf_filename != SPECIAL_PDF_IDENTIFIER:
+    if not os.path.exists(pdf_path) and special_dataset is None:
         return "无效的PDF文件", 404
 
     # 获取索引数据
@@ -141,26 +256,25 @@ def view_pdf(pdf_filename):
     total_components = 0
 
     # 处理特定PDF
-    is_special_pdf = (pdf_filename == SPECIAL_PDF_IDENTIFIER)
+    is_special_pdf = special_dataset is not None
     if is_special_pdf:
-        total_pages = len(SPECIAL_CIRCUIT_COMPONENTS)
-        total_components = sum(len(components) for components in SPECIAL_CIRCUIT_COMPONENTS.values())
+        total_pages = special_dataset.total_pages
+        total_components = special_dataset.total_components
     else:
-        index_path = os.path.join(INDEX_DIR, f"{pdf_filename.replace('.pdf', '')}.json")
-        if os.path.exists(index_path):
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    index_data = json.load(f)
+        try:
+            index_data = index_cache.get(pdf_filename)
+            if index_data is not None:
                 total_pages = index_data.get("total_pages", 0)
                 total_components = index_data.get("total_components", 0)
-            except Exception as e:
-                app.logger.warning(f"读取索引失败 {pdf_filename}：{str(e)}")
+        except Exception as e:
+            app.logger.warning(f"读取索引失败 {pdf_filename}：{str(e)}")
 
     # 处理搜索
     keyword = request.args.get('keyword', '').strip()
     search_result = None
     if keyword:
-        search_result = search_engine.search_in_pdf(pdf_filename, keyword)
+        # 首屏只渲染第一页结果，其余由页面按需加载
+        search_result = search_engine.search_in_pdf(pdf_filename, keyword, limit=SEARCH_PAGE_SIZE)
 
     return render_template(
         'view_pdf.html',
@@ -170,15 +284,213 @@ def view_pdf(pdf_filename):
         search_result=search_result,
         total_pages=total_pages,
         total_components=total_components,
-        is_special_pdf=is_special_pdf
+        is_special_pdf=is_special_pdf,
+        special_title=special_dataset.title if special_dataset else ""
+    )
+
+
+@app.route('/view/<pdf_filename>/results')
+def view_pdf_results(pdf_filename):
+    """按需加载的下一页搜索结果（HTML片段，?keyword=&offset=）
+    响应头 X-Next-Offset / X-Has-More 供页面继续加载
+    """
+    keyword = request.args.get('keyword', '').strip()
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 500))
+    if not keyword:
+        return "", 400
+
+    search_result = search_engine.search_in_pdf(pdf_filename, keyword, limit=limit, offset=offset)
+    html = render_template('_search_results.html', results=search_result["results"], offset=offset,
+                           pdf_filename=pdf_filename)
+    response = app.make_response(html)
+    response.headers["X-Next-Offset"] = str(offset + len(search_result["results"]))
+    response.headers["X-Has-More"] = "1" if search_result.get("has_more") else "0"
+    return response
+
+
+@app.route('/text/<pdf_filename>/<int:page_num>')
+def page_text(pdf_filename, page_num):
+    """按需读取某一页提取出的原文（纯文本）"""
+    text = read_page_text(pdf_filename, page_num)
+    if text is None:
+        return "页面文本不存在", 404
+    return Response(text, mimetype="text/plain")
+
+
+@app.route('/search')
+def search_library():
+    """全库搜索：在所有已处理的PDF中搜索关键词，结果按相关度全局排序"""
+    keyword = request.args.get('keyword', '').strip()
+    top_k = max(1, min(request.args.get('top_k', SEARCH_TOP_K, type=int), 1000))
+    search_result = search_engine.search_all_pdfs(keyword, top_k=top_k) if keyword else None
+    return render_template(
+        'search_all.html',
+        keyword=keyword,
+        search_result=search_result,
+        top_k=top_k
     )
 
 
+# 搜索API可选返回的结果字段
+API_RESULT_FIELDS = ["pdf_filename", "page_num", "text_type", "relevance_score", "matched_term",
+                     "highlighted_text", "full_text", "components_in_text"]
+
+
+def _parse_api_fields():
+    """解析 ?fields=page_num,relevance_score（不传时返回全部字段）；含未知字段时返回None"""
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    if not fields:
+        return API_RESULT_FIELDS
+    if any(field not in API_RESULT_FIELDS for field in fields):
+        return None
+    return fields
+
+
+def _select_fields(result, fields):
+    return {field: result[field] for field in fields if field in result}
+
+
+def _ndjson_response(lines):
+    """逐行输出JSON（application/x-ndjson），每得到一条即发送"""
+    def generate():
+        for line in lines:
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route('/api/search/<pdf_filename>')
+def api_search_pdf(pdf_filename):
+    """单文档搜索API：?keyword=&limit=&offset=&fields=&stream=1
+    stream=1 时以NDJSON逐条返回结果，最后一行为 {"summary": {...}}
+    """
+    keyword = request.args.get('keyword', '').strip()
+    fields = _parse_api_fields()
+    if not keyword:
+        return jsonify({"error": "缺少keyword参数"}), 400
+    if fields is None:
+        return jsonify({"error": f"fields只能包含：{','.join(API_RESULT_FIELDS)}"}), 400
+    if get_special_dataset(pdf_filename) is None and not os.path.exists(os.path.join(PDF_DIR, pdf_filename)):
+        return jsonify({"error": "PDF文件不存在"}), 404
+
+    limit = request.args.get('limit', type=int)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    search_result = search_engine.search_in_pdf(pdf_filename, keyword, limit=limit, offset=offset,
+                                                highlight="highlighted_text" in fields)
+    results = (_select_fields(dict(result, pdf_filename=pdf_filename), fields) for result in search_result["results"])
+    summary = {
+        "pdf_filename": pdf_filename,
+        "keyword": keyword,
+        "total": search_result["total"],
+        "offset": search_result.get("offset", offset),
+        "has_more": search_result.get("has_more", False),
+        "search_terms": search_result.get("search_terms", [])
+    }
+    if request.args.get('stream') == '1':
+        return _ndjson_response(itertools.chain(results, [{"summary": summary}]))
+    return jsonify(dict(summary, results=list(results)))
+
+
+@app.route('/api/search')
+def api_search_library():
+    """全库搜索API：?keyword=&top_k=&offset=&fields=&stream=1
+    stream=1 时各文档一搜索完成就以NDJSON输出其前top_k条结果（按文档完成顺序，不做全局排序），
+    最后一行为 {"summary": {...}}；否则返回全局排序后的JSON
+    """
+    keyword = request.args.get('keyword', '').strip()
+    fields = _parse_api_fields()
+    if not keyword:
+        return jsonify({"error": "缺少keyword参数"}), 400
+    if fields is None:
+        return jsonify({"error": f"fields只能包含：{','.join(API_RESULT_FIELDS)}"}), 400
+    top_k = max(1, min(request.args.get('top_k', SEARCH_TOP_K, type=int), 1000))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    if request.args.get('stream') == '1':
+        def stream_results():
+            per_document = {}
+            for pdf_filename, pdf_result in search_engine.iter_search_all(
+                    keyword, limit=top_k, highlight="highlighted_text" in fields):
+                if pdf_result["total"] > 0:
+                    per_document[pdf_filename] = pdf_result["total"]
+                for result in pdf_result["results"]:
+                    yield _select_fields(dict(result, pdf_filename=pdf_filename), fields)
+            yield {"summary": {"keyword": keyword, "total": sum(per_document.values()), "per_document": per_document}}
+        return _ndjson_response(stream_results())
+
+    search_result = search_engine.search_all_pdfs(keyword, top_k=top_k, offset=offset)
+    return jsonify({
+        "keyword": keyword,
+        "total": search_result["total"],
+        "offset": search_result.get("offset", offset),
+        "has_more": search_result.get("has_more", False),
+        "per_document": search_result["per_document"],
+        "search_terms": search_result["search_terms"],
+        "results": [_select_fields(result, fields) for result in search_result["results"]]
+    })
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """查询缓存命中统计（搜索结果、索引、同义词扩展、PDF页面切片、缩略图）"""
+    stats = search_engine.cache_stats()
+    stats["page_slices"] = page_slice_cache.stats()
+    stats["thumbnails"] = page_thumbnail_cache.stats()
+    return jsonify(stats)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus文本格式的监控指标（请求、搜索、索引耗时分布等）"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route('/pdfs/<pdf_filename>')
 def serve_pdf(pdf_filename):
-    """提供PDF文件下载/预览（支持中文文件名）"""
-    return send_from_directory(PDF_DIR, pdf_filename, as_attachment=False)
+    """提供PDF文件下载/预览（支持中文文件名）
+    带ETag/Last-Modified并支持Range分段请求：浏览器可复用缓存、按需分段加载大文件
+    """
+    return send_from_directory(PDF_DIR, pdf_filename, as_attachment=False, conditional=True, etag=True)
+
+
+@app.route('/pdfs/<pdf_filename>/pages/<int:first_page>')
+@app.route('/pdfs/<pdf_filename>/pages/<int:first_page>-<int:last_page>')
+def serve_pdf_pages(pdf_filename, first_page, last_page=None):
+    """只提供PDF的某一页（或连续几页）组成的小PDF，切片结果缓存在磁盘上"""
+    try:
+        path = page_slice_cache.get_slice(pdf_filename, first_page, last_page)
+    except FileNotFoundError:
+        return "PDF文件不存在", 404
+    except ValueError as e:
+        return str(e), 404
+    except Exception as e:
+        app.logger.error(f"PDF切片失败 {pdf_filename} 第{first_page}页：{str(e)}")
+        return "PDF切片失败", 500
+    download_name = f"{os.path.splitext(pdf_filename)[0]}_p{first_page}" + \
+                    (f"-{last_page}" if last_page and last_page != first_page else "") + ".pdf"
+    # 缓存文件名即内容键的摘要（文件mtime会随LRU访问刷新，不能用来生成ETag）
+    etag = os.path.splitext(os.path.basename(path))[0]
+    return send_file(path, mimetype="application/pdf", download_name=download_name, conditional=True, etag=etag,
+                     last_modified=os.path.getmtime(os.path.join(PDF_DIR, pdf_filename)))
+
+
+@app.route('/thumbnails/<pdf_filename>/<int:page_num>')
+def page_thumbnail(pdf_filename, page_num):
+    """某一页的低分辨率缩略图（PNG，首次请求时渲染并缓存）"""
+    try:
+        path = page_thumbnail_cache.get_thumbnail(pdf_filename, page_num)
+    except FileNotFoundError:
+        return "PDF文件不存在", 404
+    except ValueError as e:
+        return str(e), 404
+    except Exception as e:
+        app.logger.error(f"生成缩略图失败 {pdf_filename} 第{page_num}页：{str(e)}")
+        return "生成缩略图失败", 500
+    etag = os.path.splitext(os.path.basename(path))[0]
+    return send_file(path, mimetype="image/png", conditional=True, etag=etag,
+                     last_modified=os.path.getmtime(os.path.join(PDF_DIR, pdf_filename)))
 
 
 if __name__ == '__main__':
+    job_queue.start()
     app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
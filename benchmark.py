@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from config import *
+
+# 合成PDF使用的中文字体（Adobe标准CJK字体，阅读器和pdfplumber无需嵌入字体即可识别）
+_CJK_FONT = (
+    "<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H "
+    "/DescendantFonts [<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+    "/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> /DW 1000 >>] >>"
+)
+# 普通文本行（不含元器件名称）
+_FILLER_TEXTS = ["线径0.75mm²", "颜色：红/黑", "见下一页", "备注", "插接件针脚定义", "线束走向示意", "电压12V"]
+
+
+def _pdf_string(text):
+    """文本编码为UCS-2（大端）十六进制字符串"""
+    return "<" + text.encode("utf-16-be").hex().upper() + ">"
+
+
+def make_synthetic_pdf(path, pages=100, lines_per_page=30, components_per_line=2, table_ratio=0.25,
+                       table_rows=4, table_cols=3, seed=1):
+    """生成模拟汽车电路图的PDF（可复制文本型）
+    每页lines_per_page行文本，每行随机包含最多components_per_line个VEHICLE_COMPONENTS中的元器件
+    （标题行、"接线"描述行、普通文本行混合），table_ratio比例的页面带一个table_rows×table_cols的表格
+    """
+    from ocr_processor import VEHICLE_COMPONENTS
+    rnd = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, _CJK_FONT.encode()]
+    page_ids = []
+    # 文本区域为页面上部（y从800到340），行数较多时缩小行距和字号
+    line_height = min(14.0, 460.0 / max(1, lines_per_page))
+    font_size = round(max(4.0, min(10.0, line_height - 2)), 2)
+    for page_num in range(1, pages + 1):
+        ops = [f"BT /F1 {font_size} Tf"]
+        y = 800.0
+        for line_num in range(lines_per_page):
+            comps = rnd.sample(VEHICLE_COMPONENTS, max(0, min(components_per_line, rnd.randint(0, components_per_line))))
+            if not comps:
+                line = rnd.choice(_FILLER_TEXTS)
+            elif line_num % 3 == 0:
+                line = f"{comps[0]} {page_num}-{line_num}"
+            else:
+                line = "：接".join(comps) + f" {rnd.choice([5, 10, 15, 20])}A"
+            ops.append(f"1 0 0 1 40 {y:.2f} Tm {_pdf_string(line)} Tj")
+            y -= line_height
+        ops.append("ET")
+        # 表格：矩形边框 + 单元格文本
+        if rnd.random() < table_ratio:
+            for row in range(table_rows):
+                for col in range(table_cols):
+                    x, cell_y = 40 + col * 150, 300 - row * 20
+                    ops.append(f"{x} {cell_y} 150 20 re S")
+                    ops.append(f"BT /F1 9 Tf 1 0 0 1 {x + 3} {cell_y + 6} Tm "
+                               f"{_pdf_string(rnd.choice(VEHICLE_COMPONENTS))} Tj ET")
+        content = "\n".join(ops).encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode())
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{obj_id} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def percentiles(samples):
+    """耗时样本（秒）的统计：次数、平均值与p50/p90/p99/最大值（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+        "p50_ms": round(pick(0.50) * 1000, 4),
+        "p90_ms": round(pick(0.90) * 1000, 4),
+        "p99_ms": round(pick(0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4)
+    }
+
+
+def time_calls(func, inputs, before_each=None):
+    """逐个调用func(输入)并计时，返回统计与吞吐量（次/秒）"""
+    samples = []
+    for item in inputs:
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - start)
+    stats = percentiles(samples)
+    total = sum(samples)
+    stats["per_second"] = round(len(samples) / total, 1) if total else 0.0
+    return stats
+
+
+def peak_memory(func):
+    """执行func并返回 (返回值, Python堆内存峰值MB)（tracemalloc统计，只含当前进程）"""
+    tracemalloc.start()
+    try:
+        value = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return value, round(peak / (1024 * 1024), 2)
+
+
+def max_rss_mb():
+    """进程常驻内存峰值（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 2)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _remove_benchmark_document(pdf_filename):
+    """删除性能测试生成的PDF、索引、页面文本及目录清单记录"""
+    from index_cache import get_index_path, index_cache
+    from page_text_store import get_page_text_path
+    from catalog import catalog
+    paths = [os.path.join(PDF_DIR, pdf_filename), get_page_text_path(pdf_filename),
+             get_index_path(pdf_filename, "json"), get_index_path(pdf_filename, "binary")]
+    # 先使缓存失效（关闭二进制索引的内存映射），再删除文件
+    index_cache.invalidate(pdf_filename, close=True)
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    catalog.remove(pdf_filename)
+
+
+def run_benchmark(pages=100, lines_per_page=30, components_per_line=2, table_ratio=0.25, queries=50,
+                  workers=None, seed=1, measure_memory=True, keep=False, log_level=None):
+    """生成合成PDF并测试索引、文本分类、元器件提取、搜索和同义词扩展的性能，返回结果字典
+    log_level：根日志级别（各模块导入时会配置日志，因此在导入后设置），None时不修改
+    """
+    import ocr_processor
+    from search_engine import search_engine
+    from page_text_store import open_page_text_store
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level)
+
+    pdf_filename = f"benchmark_{pages}p_{seed}.pdf"
+    pdf_path = os.path.join(PDF_DIR, pdf_filename)
+    make_synthetic_pdf(pdf_path, pages, lines_per_page, components_per_line, table_ratio, seed=seed)
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "pages": pages, "lines_per_page": lines_per_page, "components_per_line": components_per_line,
+            "table_ratio": table_ratio, "queries": queries, "workers": workers, "seed": seed,
+            "pdf_size_bytes": os.path.getsize(pdf_path)
+        }
+    }
+
+    try:
+        # 1. 索引：全量处理、无变化时的增量处理
+        start = time.perf_counter()
+        result = ocr_processor.process_single_pdf(pdf_filename, workers=workers, incremental=False)
+        full_seconds = time.perf_counter() - start
+        if result.get("pdf_info", {}).get("status") != "success":
+            raise RuntimeError(f"索引失败：{result.get('error') or result.get('pdf_info', {}).get('error')}")
+        start = time.perf_counter()
+        ocr_processor.process_single_pdf(pdf_filename, workers=workers, incremental=True)
+        incremental_seconds = time.perf_counter() - start
+        report["indexing"] = {
+            "full_seconds": round(full_seconds, 3),
+            "pages_per_second": round(pages / full_seconds, 2),
+            "incremental_seconds": round(incremental_seconds, 3),
+            "total_components": result["total_components"],
+            "stages": result["pdf_info"].get("timings", {})  # 全量处理各阶段耗时（秒）
+        }
+        if measure_memory:
+            # 单进程全量处理的内存峰值（多进程时工作进程的内存不在统计范围内）
+            _, report["indexing"]["peak_memory_mb"] = peak_memory(
+                lambda: ocr_processor.process_single_pdf(pdf_filename, workers=1, incremental=False))
+
+        # 2. 文本分类与元器件提取（逐行，清空分类缓存后测量）
+        store = open_page_text_store(pdf_filename)
+        lines = [line.strip() for page_num in store.page_numbers() for line in store.get(page_num).split("\n")]
+        lines = [line for line in lines if len(line) >= 2]
+        ocr_processor.line_classifier.clear_cache()
+        report["get_text_type"] = time_calls(ocr_processor.get_text_type, lines,
+                                             before_each=ocr_processor.line_classifier.clear_cache)
+        report["get_text_type_cached"] = time_calls(ocr_processor.get_text_type, lines)
+        report["extract_components_from_text"] = time_calls(ocr_processor.extract_components_from_text, lines)
+
+        # 3. 搜索：随机元器件名称 + 常见泛化词；未命中缓存与命中缓存分别统计
+        rnd = random.Random(seed)
+        search_queries = rnd.sample(ocr_processor.VEHICLE_COMPONENTS, min(queries, len(ocr_processor.VEHICLE_COMPONENTS)))
+        search_queries += ["开关", "继电器", "传感器", "保险", "器"]
+
+        def search(keyword):
+            return search_engine.search_in_pdf(pdf_filename, keyword, limit=SEARCH_PAGE_SIZE)
+
+        report["search_in_pdf"] = time_calls(search, search_queries, before_each=search_engine.result_cache.clear)
+        report["search_in_pdf_cached"] = time_calls(search, search_queries)
+        if measure_memory:
+            def search_all_cold():
+                for keyword in search_queries:
+                    search_engine.result_cache.clear()
+                    search(keyword)
+            _, report["search_in_pdf"]["peak_memory_mb"] = peak_memory(search_all_cold)
+
+        # 4. 同义词扩展：词典中的全部标准词与同义词
+        synonym_handler = search_engine.synonym_handler
+        terms = list(synonym_handler.BASE_SYNONYM_DICT)
+        terms += [syn for syns in synonym_handler.BASE_SYNONYM_DICT.values() for syn in syns]
+        report["get_synonyms"] = time_calls(synonym_handler.get_synonyms, terms,
+                                            before_each=synonym_handler.clear_cache)
+    finally:
+        if not keep:
+            _remove_benchmark_document(pdf_filename)
+
+    report["max_rss_mb"] = max_rss_mb()
+    return report
+
+
+def save_report(report, output=None):
+    """保存测试结果（默认保存到BENCHMARK_DIR，文件名含时间与代码版本）"""
+    if output is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        output = os.path.join(BENCHMARK_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{report['revision']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return output
+
+
+# 汇总展示的指标：(分组, 字段, 说明, 数值越大越好)
+SUMMARY_METRICS = [
+    ("indexing", "pages_per_second", "索引吞吐量（页/秒）", True),
+    ("indexing", "incremental_seconds", "增量索引耗时（秒）", False),
+    ("indexing", "peak_memory_mb", "索引内存峰值（MB）", False),
+    ("get_text_type", "p50_ms", "文本分类p50（毫秒）", False),
+    ("extract_components_from_text", "p50_ms", "元器件提取p50（毫秒）", False),
+    ("search_in_pdf", "per_second", "搜索吞吐量（次/秒）", True),
+    ("search_in_pdf", "p90_ms", "搜索p90（毫秒）", False),
+    ("search_in_pdf", "p99_ms", "搜索p99（毫秒）", False),
+    ("search_in_pdf_cached", "p50_ms", "缓存搜索p50（毫秒）", False),
+    ("get_synonyms", "p50_ms", "同义词扩展p50（毫秒）", False),
+]
+
+
+def print_summary(report, baseline=None):
+    """打印主要指标；提供baseline（之前保存的结果）时同时打印变化比例"""
+    print(f"版本 {report['revision']}，参数 {json.dumps(report['params'], ensure_ascii=False)}")
+    for group, field, label, higher_is_better in SUMMARY_METRICS:
+        value = report.get(group, {}).get(field)
+        if value is None:
+            continue
+        line = f"  {label:<24}{value:>12}"
+        base_value = (baseline or {}).get(group, {}).get(field)
+        if base_value:
+            ratio = value / base_value
+            better = ratio > 1 if higher_is_better else ratio < 1
+            line += f"   基准 {base_value:>10}  ×{ratio:.2f}{'（提升）' if better else ''}"
+        print(line)
+
+
+if __name__ == '__main__':
+    # 用法：python benchmark.py --pages 200 --queries 100 [--compare benchmarks/旧结果.json]
+    parser = argparse.ArgumentParser(description="PDF索引与搜索性能测试（使用合成的电路图PDF）")
+    parser.add_argument("--pages", type=int, default=100, help="合成PDF页数")
+    parser.add_argument("--lines-per-page", type=int, default=30, help="每页文本行数")
+    parser.add_argument("--components-per-line", type=int, default=2, help="每行最多包含的元器件数")
+    parser.add_argument("--table-ratio", type=float, default=0.25, help="带表格的页面比例")
+    parser.add_argument("--queries", type=int, default=50, help="搜索测试的元器件关键词数")
+    parser.add_argument("--workers", type=int, default=None, help="索引进程数（默认INDEX_WORKERS）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--no-memory", action="store_true", help="不测量内存峰值（节省时间）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的PDF与索引")
+    parser.add_argument("--output", help="结果文件路径（默认保存到BENCHMARK_DIR）")
+    parser.add_argument("--compare", help="与之前保存的结果文件对比")
+    parser.add_argument("--verbose", action="store_true", help="输出处理过程日志")
+    args = parser.parse_args()
+
+    # 默认只输出警告以上的日志，避免逐页日志影响计时
+    report = run_benchmark(args.pages, args.lines_per_page, args.components_per_line, args.table_ratio,
+                           args.queries, args.workers, args.seed, not args.no_memory, args.keep,
+                           log_level=logging.INFO if args.verbose else logging.WARNING)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(report, baseline)
+    print(f"结果已保存：{save_report(report, args.output)}")
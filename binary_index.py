@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import shutil
+import logging
+import tempfile
+from collections.abc import Mapping
+from config import *
+from cache_utils import LRUCache, estimate_size
+
+# 文件格式标识与版本
+MAGIC = b"PDFIDX01"
+FORMAT_VERSION = 1
+# 文本类型编码（元素记录中用1字节整数表示）
+TEXT_TYPES = ["normal_text", "component_title", "component_desc"]
+TEXT_TYPE_CODES = {text_type: code for code, text_type in enumerate(TEXT_TYPES)}
+
+# 定长记录结构（小端，无对齐填充）
+HEADER = struct.Struct("<8sHH")  # 标识、版本、分区数
+SECTION = struct.Struct("<QQ")  # 分区偏移、记录数
+STRING_OFFSET = struct.Struct("<I")  # 字符串在字符串数据区中的结束偏移
+PAGE_RECORD = struct.Struct("<III")  # 页码、首个元素序号、元素数
+ELEMENT_RECORD = struct.Struct("<IBIH")  # 文本串号、文本类型、首个元器件序号、元器件数
+COMPONENT_RECORD = struct.Struct("<IIIH")  # 名称串号、上下文串号、首个位置序号、位置数
+SPAN_RECORD = struct.Struct("<II")  # 起始位置、结束位置
+GRAM_RECORD = struct.Struct("<III")  # n-gram串号、首个倒排项序号、倒排项数
+POSTING_RECORD = struct.Struct("<II")  # 页码、元素序号
+
+# 分区顺序
+SECTIONS = ["meta", "string_offsets", "string_data", "pages", "elements", "components", "spans", "grams", "postings"]
+
+
+# 字符串表中全文档共用的字符串的最大长度：更长的字符串（元素文本、上下文）只在同一页内去重，
+# 写入时不必为去重保留整个文档的文本
+SHARED_STRING_MAX_LENGTH = 32
+
+
+class _SectionSpool:
+    """写入时暂存一个分区的数据（临时文件），最后按分区顺序复制到索引文件"""
+
+    def __init__(self, directory):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.count = 0  # 记录数
+        self.size = 0  # 字节数
+
+    def write(self, data, count=1):
+        self.file.write(data)
+        self.count += count
+        self.size += len(data)
+
+    def copy_to(self, f):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, f)
+
+    def close(self):
+        self.file.close()
+
+
+class _StringTable:
+    """写入时的字符串表：字符串数据及其结束偏移直接写入临时文件
+    短字符串（元器件名称、n-gram等）全文档只存一份，长字符串只在同一页内去重
+    """
+
+    def __init__(self, directory):
+        self.offsets = _SectionSpool(directory)
+        self.data = _SectionSpool(directory)
+        self._shared_ids = {}
+        self._page_ids = {}
+
+    def add(self, text):
+        ids = self._shared_ids if len(text) <= SHARED_STRING_MAX_LENGTH else self._page_ids
+        string_id = ids.get(text)
+        if string_id is None:
+            string_id = ids[text] = self.offsets.count
+            self.data.write(text.encode("utf-8"))
+            self.offsets.write(STRING_OFFSET.pack(self.data.size))
+        return string_id
+
+    def end_page(self):
+        self._page_ids.clear()
+
+    def close(self):
+        self.offsets.close()
+        self.data.close()
+
+
+def write_binary_index(index_data, path):
+    """将索引数据（process_single_pdf生成的结构）写为紧凑二进制格式
+    page_elements和ngram_index.pages逐页读取（可以是按需解码的映射），各分区先写入临时文件再拼接，
+    内存占用只与字符串和n-gram的种类数有关，不随页数增长
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    strings = _StringTable(directory)
+    pages, elements, components, spans = (_SectionSpool(directory) for _ in range(4))
+    tmp_path = path + ".tmp"
+    try:
+        page_elements = index_data.get("page_elements", {})
+        for page_num_str in sorted(page_elements, key=int):
+            elems = page_elements[page_num_str]
+            pages.write(PAGE_RECORD.pack(int(page_num_str), elements.count, len(elems)))
+            for elem in elems:
+                comps = elem.get("components", [])
+                elements.write(ELEMENT_RECORD.pack(
+                    strings.add(elem["text"]), TEXT_TYPE_CODES.get(elem["text_type"], 0), components.count, len(comps)
+                ))
+                for comp in comps:
+                    comp_spans = comp.get("positions") or [comp["position"]]
+                    components.write(COMPONENT_RECORD.pack(
+                        strings.add(comp["name"]), strings.add(comp["context"]), spans.count, len(comp_spans)
+                    ))
+                    for start, end in comp_spans:
+                        spans.write(SPAN_RECORD.pack(start, end))
+            strings.end_page()
+
+        # n-gram倒排表合并为全文档倒排：先统计各n-gram的倒排项数，确定各自的写入位置
+        ngram_data = index_data.get("ngram_index") or {}
+        page_postings = ngram_data.get("pages", {})
+        gram_counts = {}
+        for page_num_str in page_postings:
+            for gram, elem_ids in page_postings[page_num_str].items():
+                gram_counts[gram] = gram_counts.get(gram, 0) + len(elem_ids)
+        grams = bytearray()
+        next_posting = {}  # {n-gram: 下一个倒排项的序号}
+        posting_count = 0
+        for gram, count in gram_counts.items():
+            grams += GRAM_RECORD.pack(strings.add(gram), posting_count, count)
+            next_posting[gram] = posting_count
+            posting_count += count
+
+        # 元信息（统计字段等）以JSON保存
+        meta = {key: value for key, value in index_data.items() if key not in ("page_elements", "ngram_index")}
+        meta["ngram_n"] = ngram_data.get("n")
+        meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        sections = [
+            (len(meta_bytes), 1),
+            (strings.offsets.size, strings.offsets.count),
+            (strings.data.size, strings.data.size),
+            (pages.size, pages.count),
+            (elements.size, elements.count),
+            (components.size, components.count),
+            (spans.size, spans.count),
+            (len(grams), len(next_posting)),
+            (POSTING_RECORD.size * posting_count, posting_count)
+        ]
+        with open(tmp_path, "w+b") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+            offset = HEADER.size + SECTION.size * len(sections)
+            for size, count in sections:
+                f.write(SECTION.pack(offset, count))
+                offset += size
+            f.write(meta_bytes)
+            for spool in (strings.offsets, strings.data, pages, elements, components, spans):
+                spool.copy_to(f)
+            f.write(grams)
+            # 倒排项：按页码顺序逐页放到各n-gram的位置上（每个n-gram的倒排项按页码、元素序号排列）
+            postings_offset = f.tell()
+            if posting_count:
+                f.truncate(offset)
+                f.flush()
+                with mmap.mmap(f.fileno(), 0) as mm:
+                    for page_num_str in sorted(page_postings, key=int):
+                        page_num = int(page_num_str)
+                        for gram, elem_ids in page_postings[page_num_str].items():
+                            position = postings_offset + POSTING_RECORD.size * next_posting[gram]
+                            data = b"".join(POSTING_RECORD.pack(page_num, elem_idx) for elem_idx in sorted(elem_ids))
+                            mm[position:position + len(data)] = data
+                            next_posting[gram] += len(elem_ids)
+        os.replace(tmp_path, path)
+    finally:
+        strings.close()
+        for spool in (pages, elements, components, spans):
+            spool.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _LazyPageElements(Mapping):
+    """按页惰性解码的page_elements（{页码字符串: 页面元素列表}）"""
+
+    def __init__(self, binary_index):
+        self._index = binary_index
+
+    def __getitem__(self, page_num_str):
+        return self._index.get_page_elements(page_num_str)
+
+    def __contains__(self, page_num_str):
+        return page_num_str in self._index.page_table
+
+    def __iter__(self):
+        return iter(self._index.page_table)
+
+    def __len__(self):
+        return len(self._index.page_table)
+
+
+class BinaryIndex:
+    """内存映射方式读取的二进制索引
+    打开时只读取文件头、元信息和页表，页面元素在访问时按页解码并缓存；
+    对外提供与JSON索引字典一致的读取方式（get / [] / page_elements）
+    """
+
+    def __init__(self, path, page_cache_size=BINARY_INDEX_PAGE_CACHE_SIZE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, section_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"不支持的索引格式：{path}")
+        self._sections = {}
+        for i, name in enumerate(SECTIONS[:section_count]):
+            self._sections[name] = SECTION.unpack_from(self._mm, HEADER.size + SECTION.size * i)
+
+        meta_offset = self._sections["meta"][0]
+        meta_end = self._sections["string_offsets"][0]
+        self.meta = json.loads(self._mm[meta_offset:meta_end].decode("utf-8"))
+        # 页表：{页码字符串: (首个元素序号, 元素数)}
+        self.page_table = {}
+        pages_offset, page_count = self._sections["pages"]
+        for page_num, first_elem, elem_count in PAGE_RECORD.iter_unpack(
+                self._mm[pages_offset:pages_offset + PAGE_RECORD.size * page_count]):
+            self.page_table[str(page_num)] = (first_elem, elem_count)
+        self._page_cache = LRUCache(page_cache_size)
+        self.page_elements = _LazyPageElements(self)
+
+    def _string(self, string_id):
+        offsets_start = self._sections["string_offsets"][0]
+        data_start = self._sections["string_data"][0]
+        end = STRING_OFFSET.unpack_from(self._mm, offsets_start + STRING_OFFSET.size * string_id)[0]
+        start = STRING_OFFSET.unpack_from(self._mm, offsets_start + STRING_OFFSET.size * (string_id - 1))[0] \
+            if string_id else 0
+        return self._mm[data_start + start:data_start + end].decode("utf-8")
+
+    def _record(self, section, record_struct, record_id):
+        return record_struct.unpack_from(self._mm, self._sections[section][0] + record_struct.size * record_id)
+
+    def get_page_elements(self, page_num_str):
+        """解码指定页的页面元素（结构与JSON索引一致）"""
+        page_num_str = str(page_num_str)
+        cached = self._page_cache.get(page_num_str)
+        if cached is not None:
+            return cached
+        first_elem, elem_count = self.page_table[page_num_str]
+        page_num = int(page_num_str)
+        elements = []
+        for elem_id in range(first_elem, first_elem + elem_count):
+            text_sid, type_code, first_comp, comp_count = self._record("elements", ELEMENT_RECORD, elem_id)
+            components = []
+            for comp_id in range(first_comp, first_comp + comp_count):
+                name_sid, context_sid, first_span, span_count = self._record("components", COMPONENT_RECORD, comp_id)
+                spans = [list(self._record("spans", SPAN_RECORD, span_id))
+                         for span_id in range(first_span, first_span + span_count)]
+                components.append({
+                    "name": self._string(name_sid),
+                    "context": self._string(context_sid),
+                    "position": spans[0],
+                    "positions": spans
+                })
+            elements.append({
+                "text": self._string(text_sid),
+                "page_num": page_num,
+                "text_type": TEXT_TYPES[type_code],
+                "components": components
+            })
+        self._page_cache.put(page_num_str, elements)
+        return elements
+
+    def ngram_postings(self):
+        """读取全文档n-gram倒排表：(n, {n-gram: [(页码, 元素序号), ...]})"""
+        grams_offset, gram_count = self._sections["grams"]
+        postings_offset = self._sections["postings"][0]
+        postings = {}
+        for gram_sid, first, count in GRAM_RECORD.iter_unpack(
+                self._mm[grams_offset:grams_offset + GRAM_RECORD.size * gram_count]):
+            start = postings_offset + POSTING_RECORD.size * first
+            postings[self._string(gram_sid)] = list(
+                POSTING_RECORD.iter_unpack(self._mm[start:start + POSTING_RECORD.size * count]))
+        return self.meta.get("ngram_n"), postings
+
+    def get(self, key, default=None):
+        if key == "page_elements":
+            return self.page_elements
+        return self.meta.get(key, default)
+
+    def __getitem__(self, key):
+        if key == "page_elements":
+            return self.page_elements
+        return self.meta[key]
+
+    def __contains__(self, key):
+        return key == "page_elements" or key in self.meta
+
+    def estimated_size(self):
+        """内存占用估算（字节）：映射的文件大小 + 元信息、页表与已解码页面缓存"""
+        return len(self._mm) + estimate_size(self.meta) + estimate_size(self.page_table) + \
+            estimate_size(self._page_cache.values())
+
+    def close(self):
+        self._mm.close()
+
+
+def convert_json_index(json_path):
+    """将一个JSON索引转换为二进制索引（写在同目录，扩展名.pidx）"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        index_data = json.load(f)
+    binary_path = os.path.splitext(json_path)[0] + BINARY_INDEX_EXT
+    write_binary_index(index_data, binary_path)
+    logging.info(f"索引已转换：{os.path.basename(json_path)}（{os.path.getsize(json_path)}字节）"
+                 f" -> {os.path.basename(binary_path)}（{os.path.getsize(binary_path)}字节）")
+    return binary_path
+
+
+def convert_all(index_dir=INDEX_DIR):
+    """转换索引目录中的全部JSON索引"""
+    converted = []
+    for filename in sorted(os.listdir(index_dir)):
+        if filename.endswith(".json") and not filename.startswith("."):
+            try:
+                converted.append(convert_json_index(os.path.join(index_dir, filename)))
+            except Exception as e:
+                logging.error(f"索引转换失败 {filename}：{str(e)}")
+    return converted
+
+
+if __name__ == '__main__':
+    # 用法：python binary_index.py [JSON索引路径 ...]（不带参数时转换INDEX_DIR下全部JSON索引）
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            convert_json_index(path)
+    else:
+        convert_all()
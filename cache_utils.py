@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+import hashlib
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(obj, sample_size=32, _seen=None):
+    """估算对象（dict/list/tuple/set/str/数字及其嵌套）占用的内存（字节）
+    元素多于sample_size的容器只测量均匀抽取的元素后按比例推算；同一对象只计算一次
+    （json.load会复用相同的键字符串）；对象提供estimated_size()时使用其结果
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if hasattr(obj, "estimated_size") and not isinstance(obj, type):
+        return obj.estimated_size()
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (dict, list, tuple, set, frozenset)):
+        count = len(obj)
+    elif hasattr(obj, "__dict__"):
+        return size + estimate_size(vars(obj), sample_size, _seen)
+    else:
+        return size
+    if not count:
+        return size
+    step = -(-count // sample_size)  # 向上取整，最多测量sample_size个元素
+    sample = obj[::step] if isinstance(obj, (list, tuple)) else list(itertools.islice(obj, 0, None, step))
+    children_bytes = 0
+    for item in sample:
+        children_bytes += estimate_size(item, sample_size, _seen)
+        if isinstance(obj, dict):
+            children_bytes += estimate_size(obj[item], sample_size, _seen)
+    return size + children_bytes * count // len(sample)
+
+
+class LRUCache:
+    """线程安全的定长LRU缓存，记录命中/未命中次数
+    ttl（秒）不为None时，条目写入超过ttl后视为过期（读取时按未命中处理并删除）
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # {键: (值, 过期时间)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expired += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item is not None else default
+
+    def values(self):
+        """当前缓存的全部值（不计入命中统计，不检查过期）"""
+        with self._lock:
+            return [value for value, _ in self._data.values()]
+
+    def pop_where(self, predicate):
+        """删除键满足predicate(键)的全部条目，返回删除条数"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """缓存统计：命中数、未命中数、命中率、当前条数"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "expired": self.expired,
+            "size": len(self._data),
+            "maxsize": self.maxsize
+        }
+
+
+class DiskCache:
+    """按内容键寻址的磁盘文件缓存，总大小超过max_bytes时按最近访问时间（文件mtime）淘汰最旧的文件
+    键为可哈希且repr稳定的值（如元组），文件名为键的SHA-1，写入先写临时文件再原子替换
+    """
+
+    def __init__(self, directory, max_bytes, suffix=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 首次写入时扫描目录得到
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + self.suffix)
+
+    def get(self, key):
+        """命中时返回缓存文件路径（并刷新访问时间），否则返回None"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def get_or_create(self, key, create):
+        """返回缓存文件路径；未命中时调用create(临时文件路径)生成文件后放入缓存"""
+        path = self.get(key)
+        if path is not None:
+            return path
+        path = self.path_for(key)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            create(tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan()[1]
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _scan(self):
+        """缓存目录中的文件：([(mtime, 大小, 路径), ...], 总大小)"""
+        files = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(self.suffix) and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files, sum(size for _, size, _ in files)
+
+    def _evict(self):
+        """删除最久未访问的文件，直到总大小不超过max_bytes（调用方持有锁）"""
+        files, total = self._scan()
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"删除缓存文件失败 {path}：{str(e)}")
+                continue
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan()[0]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+    def stats(self):
+        """缓存统计：命中数、未命中数、淘汰数、文件数、总大小"""
+        with self._lock:
+            files, total = self._scan()
+            self._total_bytes = total
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "files": len(files),
+            "size_mb": round(total / (1024 * 1024), 2),
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2)
+        }
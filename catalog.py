@@ -0,0 +1,106 @@
+import os
+import json
+import logging
+import threading
+from config import *
+from index_cache import find_index_path, load_index
+from document_store import document_store
+
+
+class Catalog:
+    """文档目录清单
+    每个已处理文档保存一条摘要记录（状态、页数、元器件数、索引文件签名），由索引程序原子更新；
+    读取时用索引文件的修改时间和大小校验记录是否过期，过期时只重新读取该文档的索引
+    """
+
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}  # {pdf_filename: 摘要记录}
+        self._file_mtime_ns = None  # 已加载的清单文件修改时间（其他进程更新清单时重新加载）
+
+    def _reload_if_changed(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._file_mtime_ns:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._records = json.load(f)
+            self._file_mtime_ns = mtime_ns
+        except Exception as e:
+            logging.warning(f"读取目录清单失败：{str(e)}")
+
+    def _save(self):
+        """原子写入清单（先写临时文件再替换）"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._records, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._file_mtime_ns = os.stat(self.path).st_mtime_ns
+
+    @staticmethod
+    def _build_record(index_data, index_path):
+        stat = os.stat(index_path)
+        return {
+            "status": index_data.get("pdf_info", {}).get("status"),
+            "total_pages": index_data.get("total_pages", 0),
+            "success_pages": index_data.get("success_pages", 0),
+            "total_components": index_data.get("total_components", 0),
+            "index_file": os.path.basename(index_path),
+            "index_mtime": stat.st_mtime,
+            "index_mtime_ns": stat.st_mtime_ns,
+            "index_size": stat.st_size
+        }
+
+    def update(self, pdf_filename, index_data, index_path):
+        """索引写入后更新该文档的摘要记录"""
+        record = self._build_record(index_data, index_path)
+        with self._lock:
+            self._reload_if_changed()
+            self._records[pdf_filename] = record
+            self._save()
+        return record
+
+    def remove(self, pdf_filename):
+        with self._lock:
+            self._reload_if_changed()
+            if self._records.pop(pdf_filename, None) is not None:
+                self._save()
+
+    def _is_valid(self, record, index_path):
+        if not record or os.path.basename(index_path) != record.get("index_file"):
+            return False
+        stat = os.stat(index_path)
+        return stat.st_mtime_ns == record.get("index_mtime_ns") and stat.st_size == record.get("index_size")
+
+    def get(self, pdf_filename):
+        """获取文档摘要记录；记录缺失或与索引文件不一致时从索引重建，没有索引时返回None
+        别名文档返回其规范文档的记录
+        """
+        pdf_filename = document_store.canonical(pdf_filename)
+        with self._lock:
+            self._reload_if_changed()
+            record = self._records.get(pdf_filename)
+        index_path = find_index_path(pdf_filename)
+        if index_path is None:
+            if record is not None:
+                self.remove(pdf_filename)
+            return None
+        if self._is_valid(record, index_path):
+            return record
+        # 清单过期（如索引由旧版本生成或被手动替换）：只重新读取该文档的索引
+        logging.info(f"目录清单记录过期，重新读取索引：{pdf_filename}")
+        index_data = load_index(index_path)
+        try:
+            return self.update(pdf_filename, index_data, index_path)
+        finally:
+            # 二进制索引：关闭内存映射（Windows下已映射的文件无法被替换）
+            if hasattr(index_data, "close"):
+                index_data.close()
+
+
+# 全局实例
+catalog = Catalog()
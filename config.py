@@ -20,3 +20,86 @@ LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
 # 陕汽轩德翼3电路图特定PDF文件名标识
 SPECIAL_PDF_IDENTIFIER = "陕汽_轩德翼3_整车电路图【玉柴ECI-CFV天然气系统_Econtrol120针ECU】【国六】分页版_可搜索.pdf"
+
+# 并行索引配置：进程池大小（<=1 表示串行处理）
+INDEX_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+# 页数少于该值的PDF直接串行处理（进程启动开销大于收益）
+PARALLEL_MIN_PAGES = 30
+# 每个分片包含的页数（分片越小负载越均衡，但调度开销越大）
+PAGES_PER_SHARD = 10
+
+# 后台处理任务记录目录
+JOB_DIR = os.path.join(BASE_DIR, "jobs")
+os.makedirs(JOB_DIR, exist_ok=True)
+# 后台处理任务并发数（单个任务内部已按页并行，通常1~2即可）
+JOB_WORKERS = 1
+# 任务列表接口最多返回的历史任务数
+JOB_HISTORY_LIMIT = 50
+
+# 文本行分类结果缓存条数（原理图中"GND"、"15A快熔"等标签大量重复）
+LINE_CLASSIFIER_CACHE_SIZE = 50000
+
+# 索引内存缓存上限（MB，按加载后的索引数据及倒排索引等派生对象估算内存占用，超出后按LRU淘汰）
+INDEX_CACHE_MAX_MB = 512
+
+# 倒排索引的字符n-gram长度（中文无分词边界，按字符二元组建立倒排）
+NGRAM_SIZE = 2
+
+# 索引存储格式："json"（可读，体积大）或 "binary"（紧凑二进制，内存映射按页读取）
+INDEX_FORMAT = "json"
+# 二进制索引扩展名
+BINARY_INDEX_EXT = ".pidx"
+# 二进制索引每个文档缓存的已解码页数
+BINARY_INDEX_PAGE_CACHE_SIZE = 64
+
+# 全库搜索：并发搜索的线程数、返回的全局结果数上限
+SEARCH_WORKERS = 8
+SEARCH_TOP_K = 100
+
+# 文档目录清单（每个已处理文档一条摘要记录，首页直接读取）
+CATALOG_FILE = os.path.join(INDEX_DIR, ".catalog.json")
+
+# 外部同义词文件（可选，JSON：{"标准词": ["同义词", ...]}，或文本：每行"标准词: 同义词1, 同义词2"）
+SYNONYM_FILE = os.path.join(BASE_DIR, "synonyms.json")
+# 同义词扩展结果缓存条数
+SYNONYM_CACHE_SIZE = 4096
+
+# 搜索结果缓存：最大条数与有效期（秒）
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 600
+
+# 查看页面每次渲染/加载的搜索结果条数
+SEARCH_PAGE_SIZE = 50
+
+# 页面文本存储（每个PDF一个文件，逐页zlib压缩）扩展名与压缩级别
+PAGE_TEXT_EXT = ".ptxt"
+PAGE_TEXT_COMPRESS_LEVEL = 6
+
+# 性能测试结果保存目录
+BENCHMARK_DIR = os.path.join(BASE_DIR, "benchmarks")
+
+# 单页/页范围PDF切片缓存：目录、总大小上限（MB）、单次请求最多切出的页数
+PAGE_CACHE_DIR = os.path.join(BASE_DIR, "cache", "pages")
+PAGE_CACHE_MAX_MB = 512
+PAGE_SLICE_MAX_PAGES = 20
+
+# 页面缩略图缓存：目录、总大小上限（MB）、缩略图宽度（像素）、处理完成后是否预先生成全部页面的缩略图
+THUMBNAIL_CACHE_DIR = os.path.join(BASE_DIR, "cache", "thumbnails")
+THUMBNAIL_CACHE_MAX_MB = 256
+THUMBNAIL_WIDTH = 200
+THUMBNAIL_PRERENDER = False
+
+# 分块上传：临时目录、建议分块大小（字节）、单个分块上限（MB）、文件大小上限（MB）、未完成会话保留时间（秒）
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_MAX_MB = 64
+UPLOAD_MAX_MB = 2048
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# 文档内容哈希与重复文档别名记录
+DOCUMENT_STORE_FILE = os.path.join(INDEX_DIR, ".documents.json")
+
+# 单个文档索引期间允许的内存增长上限（MB，0表示不限制）：每页处理完后采样内存，超过时中止该文档的处理
+# 只能事后发现，不能阻止超出（中止时已超过上限）；常驻内存由psutil或/proc读取，都不可用时按tracemalloc统计
+# 只统计处理文档的进程本身，并行处理时各工作进程的内存不计入
+INDEX_MEMORY_LIMIT_MB = 0
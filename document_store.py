@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from config import *
+from special_datasets import get_special_dataset
+
+# 计算文件哈希时每次读取的字节数
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """流式计算文件的SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def unique_pdf_filename(filename):
+    """PDF_DIR中不重名的文件名（重名时追加 _1、_2 ...）"""
+    base_name, ext = os.path.splitext(filename)
+    counter = 1
+    while os.path.exists(os.path.join(PDF_DIR, filename)):
+        filename = f"{base_name}_{counter}{ext}"
+        counter += 1
+    return filename
+
+
+class DocumentStore:
+    """按内容哈希（SHA-256）识别重复的PDF
+    内容相同的文件以别名记录到首次上传的文档（规范文档）上：别名不再单独处理，
+    索引、页面文本、切片与缩略图都使用规范文档的数据
+    记录文件：{"files": {文件名: [sha256, mtime_ns, 大小]}, "aliases": {别名: 规范文档}}
+    """
+
+    def __init__(self, path=DOCUMENT_STORE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = {}
+        self._aliases = {}
+        self._file_mtime_ns = None  # 已加载的记录文件修改时间（其他进程更新时重新加载）
+
+    def _reload_if_changed(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime_ns == self._file_mtime_ns:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._files = data.get("files", {})
+            self._aliases = data.get("aliases", {})
+            self._file_mtime_ns = mtime_ns
+        except Exception as e:
+            logging.warning(f"读取文档哈希记录失败：{str(e)}")
+
+    def _save(self):
+        """原子写入记录文件（先写临时文件再替换），调用方持有锁"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self._files, "aliases": self._aliases}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._file_mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def content_hash(self, pdf_filename):
+        """PDF_DIR中文件的SHA-256（按修改时间和大小缓存，文件未变化时不重新计算）"""
+        stat = os.stat(os.path.join(PDF_DIR, pdf_filename))
+        with self._lock:
+            self._reload_if_changed()
+            cached = self._files.get(pdf_filename)
+        if cached and cached[1] == stat.st_mtime_ns and cached[2] == stat.st_size:
+            return cached[0]
+        sha256 = file_sha256(os.path.join(PDF_DIR, pdf_filename))
+        self._record(pdf_filename, sha256)
+        return sha256
+
+    def _record(self, pdf_filename, sha256):
+        stat = os.stat(os.path.join(PDF_DIR, pdf_filename))
+        with self._lock:
+            self._reload_if_changed()
+            self._files[pdf_filename] = [sha256, stat.st_mtime_ns, stat.st_size]
+            self._save()
+
+    def canonical(self, pdf_filename):
+        """文档的规范文件名：别名返回其规范文档（规范文档已删除时返回自身），其他文档返回自身"""
+        with self._lock:
+            self._reload_if_changed()
+            target = self._aliases.get(pdf_filename)
+        if target and os.path.exists(os.path.join(PDF_DIR, target)):
+            return target
+        return pdf_filename
+
+    def alias_target(self, pdf_filename):
+        """别名对应的规范文档，不是别名时返回None"""
+        target = self.canonical(pdf_filename)
+        return target if target != pdf_filename else None
+
+    def find_duplicate(self, sha256, size):
+        """查找内容相同的已有文档（只对大小相同的文件计算哈希），返回规范文件名或None"""
+        for entry in os.scandir(PDF_DIR):
+            if not entry.name.lower().endswith(".pdf") or entry.name.startswith(".") or not entry.is_file():
+                continue
+            if entry.stat().st_size != size or get_special_dataset(entry.name) is not None:
+                continue
+            try:
+                if self.content_hash(entry.name) == sha256:
+                    return self.canonical(entry.name)
+            except OSError as e:
+                logging.warning(f"计算文件哈希失败 {entry.name}：{str(e)}")
+        return None
+
+    def store_pdf(self, source_path, filename, sha256=None):
+        """把已写入磁盘的PDF（source_path）放入PDF_DIR，内容与已有文档相同时不重复存储
+        返回 {filename, sha256, duplicate_of}：duplicate_of为内容相同的规范文档（新文档为None），
+        同名且内容相同时直接返回已有文件；不同名时以硬链接（不支持时复制）创建别名文件
+        """
+        filename = os.path.basename(filename)
+        sha256 = sha256 or file_sha256(source_path)
+        size = os.path.getsize(source_path)
+        duplicate_of = self.find_duplicate(sha256, size)
+
+        if duplicate_of is not None and os.path.exists(os.path.join(PDF_DIR, filename)) and \
+                self.canonical(filename) == duplicate_of:
+            # 重复上传同一文件（或其已有别名）：保留已有文件
+            os.remove(source_path)
+            logging.info(f"上传的文件与已有文档相同，跳过：{filename}")
+            return {"filename": filename, "sha256": sha256, "duplicate_of": duplicate_of}
+
+        with self._lock:
+            filename = unique_pdf_filename(filename)
+            target_path = os.path.join(PDF_DIR, filename)
+            if duplicate_of is not None:
+                try:
+                    os.link(os.path.join(PDF_DIR, duplicate_of), target_path)
+                    os.remove(source_path)
+                except OSError:
+                    shutil.move(source_path, target_path)
+                self._reload_if_changed()
+                self._aliases[filename] = duplicate_of
+                self._save()
+            else:
+                shutil.move(source_path, target_path)
+        self._record(filename, sha256)
+        if duplicate_of is not None:
+            logging.info(f"上传的文件与已有文档内容相同，共用索引：{filename} -> {duplicate_of}")
+        return {"filename": filename, "sha256": sha256, "duplicate_of": duplicate_of}
+
+
+# 全局实例
+document_store = DocumentStore()
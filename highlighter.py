@@ -0,0 +1,55 @@
+import html
+from multi_matcher import MultiPatternMatcher
+from cache_utils import LRUCache
+
+
+def _fold_case(text):
+    """转为小写且保持长度不变（个别字符小写后长度会变化，保持原样），保证匹配位置与原文一致"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+class Highlighter:
+    """多关键词高亮：一次扫描找出所有关键词的出现位置，合并重叠区间后生成转义过的HTML
+    同一组关键词的匹配自动机按LRU缓存复用
+    """
+
+    def __init__(self, cache_size=256):
+        self._matchers = LRUCache(cache_size)
+
+    def _get_matcher(self, terms):
+        key = tuple(sorted({_fold_case(term) for term in terms if term}))
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = MultiPatternMatcher(key, ignore_case=False)
+            self._matchers.put(key, matcher)
+        return matcher
+
+    def spans(self, text, terms):
+        """关键词在文本中的出现区间（不区分大小写），重叠或相接的区间合并：[(起始位置, 结束位置), ...]"""
+        if not text or not terms:
+            return []
+        merged = []
+        for start, end, _ in sorted(self._get_matcher(terms).iter_matches(_fold_case(text))):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [tuple(span) for span in merged]
+
+    def highlight(self, text, terms):
+        """返回高亮后的HTML：原文转义，关键词（保留原文大小写）用<mark>包裹"""
+        parts = []
+        last = 0
+        for start, end in self.spans(text, terms):
+            parts.append(html.escape(text[last:start]))
+            parts.append(f"<mark>{html.escape(text[start:end])}</mark>")
+            last = end
+        parts.append(html.escape(text[last:]))
+        return "".join(parts)
+
+
+# 全局实例
+highlighter = Highlighter()
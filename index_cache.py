@@ -0,0 +1,407 @@
+import os
+import re
+import json
+import mmap
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from config import *
+from binary_index import BinaryIndex, write_binary_index
+from cache_utils import estimate_size
+from document_store import document_store
+
+
+def get_index_path(pdf_filename, index_format=None):
+    """PDF对应的索引文件路径（默认使用INDEX_FORMAT配置的格式）"""
+    ext = BINARY_INDEX_EXT if (index_format or INDEX_FORMAT) == "binary" else ".json"
+    return os.path.join(INDEX_DIR, f"{pdf_filename.replace('.pdf', '')}{ext}")
+
+
+def find_index_path(pdf_filename):
+    """查找PDF已有的索引文件：优先配置的格式，其次另一种格式；都不存在时返回None
+    内容重复的文档（别名）使用其规范文档的索引
+    """
+    pdf_filename = document_store.canonical(pdf_filename)
+    other_format = "json" if INDEX_FORMAT == "binary" else "binary"
+    for index_format in (INDEX_FORMAT, other_format):
+        index_path = get_index_path(pdf_filename, index_format)
+        if os.path.exists(index_path):
+            return index_path
+    return None
+
+
+def list_indexed_pdfs():
+    """列出已生成索引的PDF文件名（JSON或二进制格式）"""
+    pdf_filenames = set()
+    for filename in os.listdir(INDEX_DIR):
+        base_name, ext = os.path.splitext(filename)
+        if ext in (".json", BINARY_INDEX_EXT) and not filename.startswith("."):
+            pdf_filenames.add(f"{base_name}.pdf")
+    return sorted(pdf_filenames)
+
+
+def load_index(index_path, lazy=False):
+    """按扩展名加载索引：JSON返回字典，二进制返回按页惰性解码的BinaryIndex
+    lazy为True时用于按页顺序读取一遍（如增量处理读取旧索引）：JSON索引也按页读取（返回LazyJsonIndex，
+    不加载n-gram倒排表），二进制索引不缓存多页；用完后须调用close
+    """
+    if index_path.endswith(BINARY_INDEX_EXT):
+        return BinaryIndex(index_path, page_cache_size=1) if lazy else BinaryIndex(index_path)
+    if lazy:
+        return LazyJsonIndex(index_path)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 扫描JSON结构用：字符串、键值分隔符、成员分隔符、标量值
+_JSON_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_JSON_COLON = re.compile(rb'\s*:\s*')
+_JSON_COMMA = re.compile(rb'\s*,?\s*')
+_JSON_SCALAR = re.compile(rb'[^\s,\]}]+')
+# 跳过括号之间的内容：字符串、非括号字符、不含字符串和嵌套的数组（如倒排表中的元素序号列表）
+_JSON_SKIP = re.compile(rb'(?:"[^"\\]*(?:\\.[^"\\]*)*"|[^"\[\]{}]+|\[[^"\[\]{}]*\])*')
+
+
+def _json_value_end(buf, pos):
+    """从pos开始的JSON值的结束位置（只匹配括号，不解码）"""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _JSON_STRING.match(buf, pos).end()
+    if first not in (b'{', b'['):
+        return _JSON_SCALAR.match(buf, pos).end()
+    depth = 1
+    pos += 1
+    while depth:
+        pos = _JSON_SKIP.match(buf, pos).end()
+        char = buf[pos:pos + 1]
+        if char in (b'{', b'['):
+            depth += 1
+        elif char in (b'}', b']'):
+            depth -= 1
+        else:
+            raise ValueError(f"JSON格式错误（位置{pos}）")
+        pos += 1
+    return pos
+
+
+def _iter_json_members(buf, pos):
+    """逐个产出JSON对象（pos为左花括号的位置）的成员：(键, 值起始位置, 值结束位置)"""
+    pos = _JSON_COMMA.match(buf, pos + 1).end()
+    while buf[pos:pos + 1] != b'}':
+        key_match = _JSON_STRING.match(buf, pos)
+        if key_match is None:
+            raise ValueError(f"JSON格式错误（位置{pos}）")
+        start = _JSON_COLON.match(buf, key_match.end()).end()
+        end = _json_value_end(buf, start)
+        yield json.loads(key_match.group()), start, end
+        pos = _JSON_COMMA.match(buf, end).end()
+
+
+class _LazyJsonPages(Mapping):
+    """LazyJsonIndex的page_elements（{页码字符串: 页面元素列表}，访问时才解码）"""
+
+    def __init__(self, buf, spans):
+        self._buf = buf
+        self._spans = spans  # {页码字符串: (起始位置, 结束位置)}
+
+    def __getitem__(self, page_num_str):
+        start, end = self._spans[page_num_str]
+        return json.loads(self._buf[start:end])
+
+    def __contains__(self, page_num_str):
+        return page_num_str in self._spans
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def __len__(self):
+        return len(self._spans)
+
+
+class LazyJsonIndex:
+    """按页读取的JSON索引（增量处理读取旧索引用）
+    打开时以内存映射扫描文件结构：解码摘要字段（指纹、统计等），只记录各页页面元素的位置，
+    跳过n-gram倒排表；页面元素在访问时按页解码。适用于任意缩进和字段顺序的JSON索引
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.meta = {}
+            page_spans = {}
+            start = _JSON_COMMA.match(self._mm, 0).end()
+            if self._mm[start:start + 1] != b'{':
+                raise ValueError(f"不是JSON索引：{path}")
+            for key, value_start, value_end in _iter_json_members(self._mm, start):
+                if key == "page_elements":
+                    page_spans = {page_num_str: (page_start, page_end) for page_num_str, page_start, page_end
+                                  in _iter_json_members(self._mm, value_start)}
+                elif key != "ngram_index":
+                    self.meta[key] = json.loads(self._mm[value_start:value_end])
+        except Exception:
+            self._mm.close()
+            raise
+        self.page_elements = _LazyJsonPages(self._mm, page_spans)
+
+    def get(self, key, default=None):
+        if key == "page_elements":
+            return self.page_elements
+        return self.meta.get(key, default)
+
+    def close(self):
+        self._mm.close()
+
+
+class _SpooledPages(Mapping):
+    """IndexWriter临时文件中逐页数据的只读映射（{页码字符串: 页面元素列表或n-gram倒排表}，访问时才解码）"""
+
+    def __init__(self, writer, part):
+        self._writer = writer
+        self._part = part  # 0：页面元素，1：n-gram倒排表
+
+    def __getitem__(self, page_num_str):
+        return json.loads(self._writer.read_page(int(page_num_str), self._part))
+
+    def __iter__(self):
+        return (str(page_num) for page_num in sorted(self._writer.pages))
+
+    def __len__(self):
+        return len(self._writer.pages)
+
+
+class IndexWriter:
+    """逐页写入索引，内存占用不随页数增长
+    每页的页面元素和n-gram倒排表处理完立即序列化到临时文件；finish时按页码顺序拼接出最终索引
+    （JSON直接复制已序列化的数据，二进制格式从临时文件逐页读取），统计等摘要字段写在最后，原子替换旧索引
+    """
+
+    def __init__(self, pdf_filename, index_format=None):
+        self.pdf_filename = pdf_filename
+        self.index_format = index_format or INDEX_FORMAT
+        self.path = get_index_path(pdf_filename, self.index_format)
+        self._spool_path = self.path + ".pages.tmp"
+        self._spool = open(self._spool_path, "w+b")
+        self.pages = {}  # {页码: ((页面元素偏移, 长度), (倒排表偏移, 长度))}
+
+    def add_page(self, page_num, page_elements, ngram_postings):
+        """写入一页的数据（同一页重复写入时以最后一次为准）"""
+        parts = []
+        offset = self._spool.seek(0, os.SEEK_END)
+        for value in (page_elements, ngram_postings):
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            self._spool.write(data)
+            parts.append((offset, len(data)))
+            offset += len(data)
+        self.pages[int(page_num)] = tuple(parts)
+
+    def read_page(self, page_num, part):
+        offset, length = self.pages[page_num][part]
+        self._spool.seek(offset)
+        return self._spool.read(length)
+
+    def _write_json(self, summary, path):
+        ngram_meta = {key: value for key, value in summary.get("ngram_index", {}).items() if key != "pages"}
+        with open(path, "wb") as f:
+            for part, (prefix, suffix) in enumerate([(b'{"page_elements": {', b'}'),
+                                                     (b', "ngram_index": {"pages": {', b'}')]):
+                f.write(prefix)
+                for i, page_num in enumerate(sorted(self.pages)):
+                    f.write(f'{", " if i else ""}"{page_num}": '.encode("utf-8"))
+                    f.write(self.read_page(page_num, part))
+                f.write(suffix)
+            for key, value in ngram_meta.items():
+                f.write(f", {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}".encode("utf-8"))
+            f.write(b"}")
+            # 摘要字段（统计、指纹、处理信息）
+            for key, value in summary.items():
+                if key not in ("page_elements", "ngram_index"):
+                    f.write(f", {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}".encode("utf-8"))
+            f.write(b"}")
+
+    def finish(self, summary):
+        """写出最终索引：summary为除逐页数据（page_elements、ngram_index.pages）以外的索引字段
+        删除另一种格式的旧索引并使缓存失效，返回索引文件路径
+        调用方打开的旧索引（如增量处理读取的二进制索引）须在调用前关闭
+        """
+        new_path = self.path + ".new"
+        try:
+            if self.index_format == "binary":
+                ngram_meta = {key: value for key, value in summary.get("ngram_index", {}).items() if key != "pages"}
+                index_data = dict(summary, page_elements=_SpooledPages(self, 0),
+                                  ngram_index=dict(ngram_meta, pages=_SpooledPages(self, 1)))
+                write_binary_index(index_data, new_path)
+            else:
+                self._write_json(summary, new_path)
+            # 替换前使缓存失效并关闭旧索引的内存映射（Windows下无法替换或删除已映射的文件）
+            index_cache.invalidate(self.pdf_filename, close=True)
+            os.replace(new_path, self.path)
+        finally:
+            self.close()
+            if os.path.exists(new_path):
+                os.remove(new_path)
+        for index_format in ("json", "binary"):
+            stale_path = get_index_path(self.pdf_filename, index_format)
+            if stale_path != self.path and os.path.exists(stale_path):
+                os.remove(stale_path)
+        return self.path
+
+    def close(self):
+        """关闭并删除临时文件（处理失败时调用，不影响旧索引）"""
+        if not self._spool.closed:
+            self._spool.close()
+        if os.path.exists(self._spool_path):
+            os.remove(self._spool_path)
+
+
+def write_index(pdf_filename, index_data):
+    """按INDEX_FORMAT写入完整的索引数据，删除另一种格式的旧索引，并使缓存失效"""
+    writer = IndexWriter(pdf_filename)
+    try:
+        page_postings = index_data.get("ngram_index", {}).get("pages", {})
+        for page_num_str, page_elements in index_data.get("page_elements", {}).items():
+            writer.add_page(page_num_str, page_elements, page_postings.get(page_num_str, {}))
+    except Exception:
+        writer.close()
+        raise
+    return writer.finish(index_data)
+
+
+class IndexCache:
+    """进程内索引缓存
+    以PDF文件名为键，按索引文件的路径、修改时间和大小校验有效性；
+    总占用（加载后的索引数据与派生对象的估算内存，见estimate_size）超过上限时按LRU淘汰
+    """
+
+    def __init__(self, max_bytes=INDEX_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # {pdf_filename: {"signature": (路径, mtime_ns, size), "data": 索引数据, "attachments": {名称: 派生对象},
+        #                 "attachment_bytes": 派生对象估算内存, "bytes": 条目总估算内存}}
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._listeners = []  # 缓存失效回调 listener(pdf_filename)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pdf_filename):
+        """获取PDF索引数据；索引文件不存在时返回None，文件损坏时抛出异常"""
+        return self.get_versioned(pdf_filename)[0]
+
+    def get_versioned(self, pdf_filename):
+        """获取PDF索引数据及其版本：(索引数据, (路径, mtime_ns, size))；索引文件不存在时返回 (None, None)"""
+        pdf_filename = document_store.canonical(pdf_filename)
+        index_path = find_index_path(pdf_filename)
+        try:
+            stat = os.stat(index_path) if index_path else None
+        except FileNotFoundError:
+            stat = None
+        if stat is None:
+            # 索引已被删除：只在确有缓存项时失效（未建索引的PDF每次搜索都会走到这里）
+            with self._lock:
+                cached = pdf_filename in self._entries
+            if cached:
+                self.invalidate(pdf_filename)
+            return None, None
+        signature = (index_path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(pdf_filename)
+            if entry and entry["signature"] == signature:
+                self._entries.move_to_end(pdf_filename)
+                self.hits += 1
+                return entry["data"], signature
+            self.misses += 1
+
+        # 缓存未命中或索引已更新：重新加载（不持锁，避免阻塞其他文档的读取）
+        data = load_index(index_path)
+        self._put(pdf_filename, signature, data, estimate_size(data))
+        return data, signature
+
+    def get_attachment(self, pdf_filename, name, builder, data=None):
+        """获取由索引数据派生的对象（如倒排索引），随索引一起缓存和失效
+        builder(索引数据) 用于缓存未命中时构建派生对象；data为调用方已取得的索引数据（省略时从缓存获取）
+        索引不存在，或索引数据未被缓存（超过缓存上限）时返回None，避免每次调用都重新构建
+        """
+        pdf_filename = document_store.canonical(pdf_filename)
+        if data is None:
+            data = self.get(pdf_filename)
+            if data is None:
+                return None
+        with self._lock:
+            entry = self._entries.get(pdf_filename)
+            if entry is None or entry["data"] is not data:
+                return None
+            if name in entry["attachments"]:
+                return entry["attachments"][name]
+        attachment = builder(data)
+        # builder可能删除索引数据中已并入派生对象的部分（如按页倒排表），重新估算索引数据的占用
+        data_size = estimate_size(data)
+        attachment_size = estimate_size(attachment)
+        with self._lock:
+            entry = self._entries.get(pdf_filename)
+            if entry is not None and entry["data"] is data and name not in entry["attachments"]:
+                entry["attachments"][name] = attachment
+                entry["attachment_bytes"] += attachment_size
+                size = data_size + entry["attachment_bytes"]
+                self._total_bytes += size - entry["bytes"]
+                entry["bytes"] = size
+                self._evict()
+        return attachment
+
+    def _put(self, pdf_filename, signature, data, size):
+        with self._lock:
+            self._remove(pdf_filename)
+            if size > self.max_bytes:
+                logging.warning(f"索引超过缓存上限，不缓存：{pdf_filename}（约{size}字节）")
+                return
+            self._entries[pdf_filename] = {"signature": signature, "data": data, "attachments": {},
+                                           "attachment_bytes": 0, "bytes": size}
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """按LRU淘汰，直到总占用不超过上限（调用方持有锁）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            evicted_name = next(iter(self._entries))
+            self._remove(evicted_name)
+            logging.info(f"索引缓存淘汰：{evicted_name}")
+
+    def _remove(self, pdf_filename, close=False):
+        """移出缓存；其他线程可能仍在读取被移出的索引，二进制索引的内存映射默认由垃圾回收关闭"""
+        entry = self._entries.pop(pdf_filename, None)
+        if entry:
+            self._total_bytes -= entry["bytes"]
+            if close and hasattr(entry["data"], "close"):
+                entry["data"].close()
+
+    def add_listener(self, listener):
+        """注册缓存失效回调（如搜索结果缓存随索引一起失效）"""
+        self._listeners.append(listener)
+
+    def invalidate(self, pdf_filename, close=False):
+        """使指定PDF的缓存失效（重新处理PDF后调用）
+        close为True时立即关闭二进制索引的内存映射，只在替换或删除索引文件前使用（Windows下已映射的文件
+        无法被替换或删除）；此时仍在读取该索引的请求会失败
+        """
+        with self._lock:
+            self._remove(pdf_filename, close)
+        for listener in self._listeners:
+            listener(pdf_filename)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "documents": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+# 全局实例（搜索与页面查看共用）
+index_cache = IndexCache()
@@ -0,0 +1,170 @@
+import os
+import json
+import uuid
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+from ocr_processor import process_single_pdf
+from pdf_pages import page_thumbnail_cache
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_FAILED = "failed"
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class JobQueue:
+    """后台PDF处理任务队列（线程池执行，任务记录持久化到JOB_DIR）
+    导入模块时不读取任务记录（并行索引的spawn工作进程会重新导入本模块），由服务启动时调用start加载；
+    未调用start时在首次使用时加载
+    """
+
+    def __init__(self, job_dir=JOB_DIR, workers=JOB_WORKERS):
+        self.job_dir = job_dir
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._jobs = {}  # {job_id: 任务记录}
+        self._executor = None
+        self._started = False
+
+    def start(self):
+        """启动任务队列：加载历史任务记录（重复调用无影响）"""
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.job_dir, exist_ok=True)
+            self._load_jobs()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-job")
+            self._started = True
+
+    def _job_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _load_jobs(self):
+        """加载历史任务记录；服务重启前未完成的任务标记为失败"""
+        for filename in os.listdir(self.job_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.job_dir, filename), 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except Exception as e:
+                logging.warning(f"读取任务记录失败 {filename}：{str(e)}")
+                continue
+            if job.get("status") in ACTIVE_STATUSES:
+                job["status"] = JOB_FAILED
+                job["error"] = "服务重启，任务中断"
+                job["finished_at"] = time.time()
+                self._save(job)
+            self._jobs[job["job_id"]] = job
+
+    def _save(self, job):
+        """原子写入任务记录（先写临时文件再替换）"""
+        path = self._job_path(job["job_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            self._save(job)
+            return dict(job)
+
+    def submit(self, pdf_filename, incremental=True):
+        """提交处理任务；同一PDF已有未完成任务时直接返回该任务
+        incremental=False 时忽略上次索引，全量重新处理
+        """
+        self.start()
+        with self._lock:
+            active = self._active_job_for(pdf_filename)
+            if active:
+                return dict(active)
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "pdf_filename": pdf_filename,
+                "status": JOB_QUEUED,
+                "incremental": incremental,
+                "total_pages": 0,
+                "processed_pages": 0,
+                "progress": 0.0,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None
+            }
+            self._jobs[job["job_id"]] = job
+            self._save(job)
+        self._executor.submit(self._run, job["job_id"])
+        logging.info(f"已提交处理任务：{pdf_filename}（{job['job_id']}）")
+        return dict(job)
+
+    def _run(self, job_id):
+        pdf_filename = self._jobs[job_id]["pdf_filename"]
+        incremental = self._jobs[job_id].get("incremental", True)
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+
+        def on_progress(processed_pages, total_pages):
+            self._update(
+                job_id,
+                processed_pages=processed_pages,
+                total_pages=total_pages,
+                progress=round(processed_pages / total_pages, 4) if total_pages else 0.0
+            )
+
+        try:
+            result = process_single_pdf(pdf_filename, progress_callback=on_progress, incremental=incremental)
+            pdf_info = result.get("pdf_info", {})
+            if pdf_info.get("status") == "success":
+                status, error = JOB_SUCCESS, None
+            else:
+                status, error = JOB_FAILED, result.get("error") or pdf_info.get("error")
+        except Exception as e:
+            logging.error(f"处理任务异常 {pdf_filename}：{str(e)}")
+            status, error = JOB_FAILED, str(e)
+        self._update(job_id, status=status, error=error, finished_at=time.time())
+
+        if status == JOB_SUCCESS and THUMBNAIL_PRERENDER:
+            try:
+                rendered = page_thumbnail_cache.prerender(pdf_filename)
+                logging.info(f"已生成页面缩略图：{pdf_filename}（{rendered}页）")
+            except Exception as e:
+                logging.warning(f"生成页面缩略图失败 {pdf_filename}：{str(e)}")
+
+    def _active_job_for(self, pdf_filename):
+        for job in self._jobs.values():
+            if job["pdf_filename"] == pdf_filename and job["status"] in ACTIVE_STATUSES:
+                return job
+        return None
+
+    def active_job_for(self, pdf_filename):
+        """获取PDF当前未完成的任务（无则返回None）"""
+        self.start()
+        with self._lock:
+            job = self._active_job_for(pdf_filename)
+            return dict(job) if job else None
+
+    def get(self, job_id):
+        self.start()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, active_only=False, limit=JOB_HISTORY_LIMIT):
+        """按创建时间倒序列出任务"""
+        self.start()
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values()
+                    if not active_only or job["status"] in ACTIVE_STATUSES]
+        jobs.sort(key=lambda x: x["created_at"], reverse=True)
+        return jobs[:limit]
+
+
+# 全局实例
+job_queue = JobQueue()
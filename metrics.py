@@ -0,0 +1,242 @@
+import os
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # 可选依赖：未安装时Linux读取/proc，其他平台改用tracemalloc
+    psutil = None
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 内存直方图的分桶（MB）
+MEMORY_BUCKETS_MB = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增计数器（按标签值分别计数）"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """直方图（累计分桶计数 + 总和 + 次数），用于耗时分布"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {标签值: [各分桶计数, 总和, 次数]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：with histogram.time(stage="x"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内指标注册表，输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """把代码块耗时（秒）累加到 timings[stage]（用于按阶段统计单页/单个文档的耗时）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def merge_timings(total, timings):
+    """把一组阶段耗时累加到total中"""
+    for stage, seconds in (timings or {}).items():
+        total[stage] = total.get(stage, 0.0) + seconds
+    return total
+
+
+def current_rss_bytes():
+    """当前进程的常驻内存（字节）：优先psutil（跨平台），其次Linux的/proc/self/statm；都不可用时返回None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# 使用tracemalloc的MemoryTracker数量（tracemalloc由MemoryTracker启动时，最后一个停止时关闭）
+_tracemalloc_users = 0
+_tracemalloc_started = False
+_tracemalloc_lock = threading.Lock()
+
+
+class MemoryTracker:
+    """采样跟踪一段处理过程中的内存：起始值、峰值（每次sample时更新）
+    优先测量本进程常驻内存；无法读取时（如Windows未安装psutil）改用tracemalloc统计Python对象占用的内存
+    （不含C扩展自行分配的内存，且会拖慢处理），report中的source注明测量方式；使用完毕后调用stop
+    """
+
+    def __init__(self):
+        self.source = "rss" if current_rss_bytes() is not None else "tracemalloc"
+        self._tracing = False
+        if self.source == "tracemalloc":
+            global _tracemalloc_users, _tracemalloc_started
+            with _tracemalloc_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_started = True
+                _tracemalloc_users += 1
+            self._tracing = True
+        self.start = self.peak = self._current()
+
+    def _current(self):
+        if self.source == "rss":
+            return current_rss_bytes() or 0
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+    def sample(self):
+        current = self._current()
+        self.peak = max(self.peak, current)
+        return current
+
+    def growth(self):
+        return self.peak - self.start
+
+    def stop(self):
+        """停止跟踪（使用tracemalloc时释放其开销，可重复调用）"""
+        global _tracemalloc_users, _tracemalloc_started
+        if not self._tracing:
+            return
+        self._tracing = False
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                tracemalloc.stop()
+                _tracemalloc_started = False
+
+    def report(self):
+        """内存统计（MB）"""
+        return {
+            "source": self.source,
+            "rss_start_mb": round(self.start / (1024 * 1024), 1),
+            "rss_peak_mb": round(self.peak / (1024 * 1024), 1),
+            "rss_growth_mb": round(self.growth() / (1024 * 1024), 1)
+        }
+
+
+# 全局注册表与各模块使用的指标
+metrics = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "pdf_search_http_request_seconds", "HTTP请求处理耗时（秒）", ["endpoint", "method", "status"])
+SEARCH_SECONDS = metrics.histogram(
+    "pdf_search_search_seconds", "搜索耗时（秒）：pdf为单文档搜索，library为全库搜索", ["scope"])
+SEARCH_STAGE_SECONDS = metrics.histogram(
+    "pdf_search_search_stage_seconds",
+    "单次搜索各阶段耗时（秒）：load_index加载索引、synonyms同义词扩展、candidates候选查找、verify匹配校验、"
+    "rank排序分页、merge全库归并、highlight高亮", ["scope", "stage"])
+SEARCH_CACHE_TOTAL = metrics.counter(
+    "pdf_search_query_cache_total", "搜索结果缓存命中/未命中次数", ["result"])
+INDEX_DOCUMENT_SECONDS = metrics.histogram(
+    "pdf_search_index_document_seconds", "单个文档索引总耗时（秒）", ["status"])
+INDEX_STAGE_SECONDS = metrics.histogram(
+    "pdf_search_index_stage_seconds", "单个文档索引各阶段耗时（秒，页面阶段为全部页面之和）", ["stage"])
+INDEX_MEMORY_GROWTH_MB = metrics.histogram(
+    "pdf_search_index_memory_growth_megabytes", "单个文档索引期间常驻内存的峰值增长（MB，按页采样）", [],
+    buckets=MEMORY_BUCKETS_MB)
+INDEX_PAGES_TOTAL = metrics.counter(
+    "pdf_search_index_pages_total", "索引处理的页面数：extracted重新提取、reused复用、reclassified重新分类、failed失败",
+    ["result"])
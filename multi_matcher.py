@@ -0,0 +1,76 @@
+from collections import deque
+
+
+class MultiPatternMatcher:
+    """Aho-Corasick多模式匹配自动机
+    由词典一次性构建，对每段文本只扫描一遍即可找出所有模式串的全部出现位置，
+    耗时与文本长度和命中数相关，与词典大小无关
+    """
+
+    def __init__(self, patterns, ignore_case=True):
+        self.ignore_case = ignore_case
+        # 去重并保留原始顺序（模式串序号即其在词典中的首次出现顺序）
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self._goto = [{}]  # 状态转移表：[{字符: 下一状态}]
+        self._fail = [0]  # 失败指针
+        self._output = [[]]  # 每个状态命中的模式串序号
+        self._lengths = []  # 规范化后的模式串长度
+        for pattern_id, pattern in enumerate(self.patterns):
+            normalized = self._normalize(pattern)
+            self._lengths.append(len(normalized))
+            self._add(pattern_id, normalized)
+        self._build_fail_links()
+
+    def _normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _add(self, pattern_id, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(pattern_id)
+
+    def _build_fail_links(self):
+        """按广度优先计算失败指针，并把失败链上的输出合并到当前状态"""
+        # 根节点的直接子状态失败指针指向根
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """逐个产出匹配：(起始位置, 结束位置, 模式串序号)，位置基于规范化（小写）后的文本"""
+        state = 0
+        goto, fail, output, lengths = self._goto, self._fail, self._output, self._lengths
+        for idx, char in enumerate(self._normalize(text)):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                yield idx + 1 - lengths[pattern_id], idx + 1, pattern_id
+
+    def find_all(self, text):
+        """返回文本中所有模式串的全部出现：[(起始位置, 结束位置, 模式串)]"""
+        if not text:
+            return []
+        return [(start, end, self.patterns[pattern_id]) for start, end, pattern_id in self.iter_matches(text)]
+
+    def group_matches(self, text):
+        """按模式串分组返回全部出现位置：{模式串序号: [(起始位置, 结束位置), ...]}（按词典顺序）"""
+        grouped = {}
+        for start, end, pattern_id in self.iter_matches(text):
+            grouped.setdefault(pattern_id, []).append((start, end))
+        return dict(sorted(grouped.items()))
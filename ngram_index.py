@@ -0,0 +1,117 @@
+from config import *
+
+
+def text_ngrams(text, n=NGRAM_SIZE):
+    """文本（小写）中所有长度为n的字符片段集合"""
+    text = text.lower()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def build_page_postings(page_elements, n=NGRAM_SIZE):
+    """构建单页倒排表：{n-gram: [元素序号, ...]}（元素序号为该页page_elements中的下标）"""
+    postings = {}
+    for elem_idx, elem in enumerate(page_elements):
+        for gram in text_ngrams(elem["text"].strip(), n):
+            postings.setdefault(gram, []).append(elem_idx)
+    return postings
+
+
+class NgramIndex:
+    """字符n-gram倒排索引
+    由索引文件中按页存储的倒排表合并为全文档倒排表，查询时对检索词的所有n-gram
+    求交集得到候选元素，再由调用方校验子串，耗时与命中数量相关而与文档大小无关
+    """
+
+    def __init__(self, n, postings):
+        self.n = n
+        self._postings = postings  # {n-gram: [(页码, 元素序号), ...]}
+
+    @classmethod
+    def from_page_postings(cls, n, page_postings):
+        """由按页倒排表 {页码: {n-gram: [元素序号]}} 合并构建"""
+        postings = {}
+        for page_num_str, page_grams in page_postings.items():
+            page_num = int(page_num_str)
+            for gram, elem_ids in page_grams.items():
+                postings.setdefault(gram, []).extend((page_num, elem_idx) for elem_idx in elem_ids)
+        return cls(n, postings)
+
+    @classmethod
+    def from_index(cls, pdf_index, release_pages=False):
+        """从索引数据构建；旧索引没有倒排表时现场按页构建
+        release_pages为True时构建后从JSON索引数据中删除按页倒排表（已合并到本对象，缓存的索引不再重复保存）
+        """
+        if hasattr(pdf_index, "ngram_postings"):
+            # 二进制索引：直接读取已合并的倒排表
+            n, postings = pdf_index.ngram_postings()
+            if n == NGRAM_SIZE:
+                return cls(n, postings)
+        else:
+            ngram_data = pdf_index.get("ngram_index")
+            if ngram_data and ngram_data.get("n") == NGRAM_SIZE and "pages" in ngram_data:
+                ngram_index = cls.from_page_postings(ngram_data["n"], ngram_data["pages"])
+                if release_pages:
+                    ngram_data.pop("pages", None)
+                return ngram_index
+        page_postings = {
+            page_num_str: build_page_postings(elements)
+            for page_num_str, elements in pdf_index.get("page_elements", {}).items()
+        }
+        return cls.from_page_postings(NGRAM_SIZE, page_postings)
+
+    @classmethod
+    def candidates_from_index(cls, pdf_index, terms):
+        """不缓存合并倒排表时直接从索引数据求候选元素（用于超过缓存上限、未被缓存的索引）
+        JSON索引逐页对按页倒排表求交集，不必合并；索引没有可用的倒排表或检索词无法使用倒排时返回None
+        """
+        if hasattr(pdf_index, "ngram_postings"):
+            n, postings = pdf_index.ngram_postings()
+            return cls(n, postings).candidates_for_terms(terms) if n == NGRAM_SIZE else None
+        ngram_data = pdf_index.get("ngram_index")
+        if not ngram_data or ngram_data.get("n") != NGRAM_SIZE or "pages" not in ngram_data:
+            return None
+        terms = [term.lower() for term in terms]
+        if any(len(term) < NGRAM_SIZE for term in terms):
+            return None
+        term_grams = [text_ngrams(term) for term in terms]
+        result = []
+        for page_num_str, page_grams in ngram_data["pages"].items():
+            page_num = int(page_num_str)
+            page_candidates = set()
+            for grams in term_grams:
+                posting_lists = sorted((page_grams.get(gram, ()) for gram in grams), key=len)
+                term_candidates = set(posting_lists[0])
+                for posting_list in posting_lists[1:]:
+                    if not term_candidates:
+                        break
+                    term_candidates.intersection_update(posting_list)
+                page_candidates |= term_candidates
+            result.extend((page_num, elem_idx) for elem_idx in page_candidates)
+        return sorted(result)
+
+    def candidates(self, term):
+        """检索词的候选元素集合 {(页码, 元素序号)}；检索词短于n时无法使用倒排，返回None"""
+        term = term.lower()
+        if len(term) < self.n:
+            return None
+        # 从最短的倒排表开始求交集
+        posting_lists = sorted(
+            (self._postings.get(gram, []) for gram in text_ngrams(term, self.n)),
+            key=len
+        )
+        result = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            if not result:
+                break
+            result.intersection_update(posting_list)
+        return result
+
+    def candidates_for_terms(self, terms):
+        """多个检索词的候选元素并集（按页码、元素序号排序）；任一检索词无法使用倒排时返回None"""
+        result = set()
+        for term in terms:
+            term_candidates = self.candidates(term)
+            if term_candidates is None:
+                return None
+            result |= term_candidates
+        return sorted(result)
@@ -1,10 +1,21 @@
 import os
 import json
-import re
 import logging
 import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
+from pdfminer.pdftypes import resolve1, PDFStream
 from config import *
+from multi_matcher import MultiPatternMatcher
+from text_classifier import LineClassifier
+from index_cache import IndexWriter, find_index_path, load_index
+from ngram_index import build_page_postings
+from catalog import catalog
+from page_text_store import PageTextWriter
+from metrics import stage_timer, merge_timings, MemoryTracker, INDEX_DOCUMENT_SECONDS, INDEX_STAGE_SECONDS, \
+    INDEX_PAGES_TOTAL, INDEX_MEMORY_GROWTH_MB
 
 # 日志配置
 logging.basicConfig(
@@ -132,104 +143,153 @@ TEXT_TYPE_PATTERNS = {
 }
 
 
-def get_text_type(text):
+# 元器件多模式匹配自动机（模块加载时由词典构建一次，分类与提取共用）
+component_matcher = MultiPatternMatcher(VEHICLE_COMPONENTS)
+
+
+def match_components(text):
+    """单次扫描找出文本中所有元器件的全部出现位置：{元器件序号: [(起始, 结束), ...]}"""
+    return component_matcher.group_matches(text)
+
+
+# 文本行分类器（预编译规则 + 分类结果缓存）
+line_classifier = LineClassifier(TEXT_TYPE_PATTERNS, component_matcher)
+
+# 词典/规则版本：VEHICLE_COMPONENTS或TEXT_TYPE_PATTERNS变化时改变，用于增量处理时判断是否需要重新分类
+RULES_VERSION = hashlib.sha1(
+    json.dumps([VEHICLE_COMPONENTS, TEXT_TYPE_PATTERNS], ensure_ascii=False).encode("utf-8")
+).hexdigest()[:12]
+
+
+def get_text_type(text, component_matches=None):
     """判断文本类型（适配汽车电气系统文本特点）
     返回：component_title(元件标题) > component_desc(元件描述/表格) > normal_text(普通文本)
+    component_matches：match_components(已去除首尾空白的文本)的结果，不传则现场匹配
     """
-    text = text.strip()
-    if not text:
-        return "normal_text"
-
-    # 1. 判断是否为元件标题（最高优先级）
-    for pattern in TEXT_TYPE_PATTERNS["component_title"]:
-        if re.search(pattern, text, re.IGNORECASE):
-            return "component_title"
-    # 额外判断：是否为明确的元器件名称（从VEHICLE_COMPONENTS匹配）
-    for comp in VEHICLE_COMPONENTS:
-        if comp in text and len(comp) > 2:  # 避免太短的匹配（如"开关"）
-            return "component_title"
-
-    # 2. 判断是否为元件描述/表格（中优先级）
-    for pattern in TEXT_TYPE_PATTERNS["component_desc"]:
-        if re.search(pattern, text, re.IGNORECASE):
-            return "component_desc"
-    # 额外判断：包含元器件名称且带描述性内容
-    for comp in VEHICLE_COMPONENTS:
-        if comp in text and (":" in text or "→" in text or "=" in text):
-            return "component_desc"
-
-    # 3. 普通文本（低优先级）
-    return "normal_text"
-
-
-def extract_components_from_text(text):
-    """从文本中提取元器件（基于VEHICLE_COMPONENTS精准匹配）"""
-    components = []
-    text_lower = text.lower()
-    for comp in VEHICLE_COMPONENTS:
-        comp_lower = comp.lower()
-        if comp_lower in text_lower:
-            # 记录元器件在文本中的位置和上下文
-            start_idx = text_lower.index(comp_lower)
-            end_idx = start_idx + len(comp_lower)
-            # 取前后10个字符作为上下文
-            context_start = max(0, start_idx - 10)
-            context_end = min(len(text), end_idx + 10)
-            context = text[context_start:context_end].replace("\n", " ")
-            components.append({
-                "name": comp,
-                "context": context,
-                "position": (start_idx, end_idx)
-            })
-    # 去重（同一文本中同一元器件多次出现只保留一次）
-    unique_components = []
-    seen_comps = set()
-    for comp in components:
-        if comp["name"] not in seen_comps:
-            seen_comps.add(comp["name"])
-            unique_components.append(comp)
-    return unique_components
+    return line_classifier.classify(text, component_matches)
 
 
-def process_single_page(pdf_path, page_num, pdf_filename):
-    """处理单页（提取汽车元器件和分类文本）"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            if page_num - 1 >= len(pdf.pages):
-                raise Exception(f"页码{page_num}超出范围")
-            page = pdf.pages[page_num - 1]
-            # 提取文本（保留原始格式，包括换行）
-            raw_text = page.extract_text() or ""
-            # 提取页面中的表格文本（如果有表格，优先按表格处理）
-            table_text = ""
-            if page.extract_tables():
-                for table in page.extract_tables():
-                    for row in table:
-                        row_text = " ".join([cell.strip() for cell in row if cell and cell.strip()])
-                        if row_text:
-                            table_text += row_text + "\n"
-
-        # 合并原始文本和表格文本
-        full_text = raw_text + "\n" + table_text
-        # 保存页面文本（用于调试，保留原始格式）
-        page_save_dir = os.path.join(INDEX_DIR, pdf_filename.replace(".pdf", ""))
-        os.makedirs(page_save_dir, exist_ok=True)
-        with open(os.path.join(page_save_dir, f"page_{page_num}_text.txt"), 'w', encoding='utf-8') as f:
-            f.write(f"=== 第{page_num}页 ===\n{full_text}")
-
-        # 逐行分析文本，提取页面元素（包含文本类型和元器件信息）
-        page_elements = []
-        lines = full_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line or len(line) < 2:  # 过滤空行和过短文本
-                continue
+def extract_components_from_text(text, component_matches=None):
+    """从文本中提取元器件（基于VEHICLE_COMPONENTS精准匹配）
+    同一元器件多次出现只保留一条记录，position为首次出现位置，positions为全部出现位置
+    """
+    if component_matches is None:
+        component_matches = match_components(text)
+    components = []
+    for comp_id, spans in component_matches.items():
+        # 记录元器件在文本中的位置和上下文
+        start_idx, end_idx = spans[0]
+        # 取前后10个字符作为上下文
+        context_start = max(0, start_idx - 10)
+        context_end = min(len(text), end_idx + 10)
+        context = text[context_start:context_end].replace("\n", " ")
+        components.append({
+            "name": component_matcher.patterns[comp_id],
+            "context": context,
+            "position": (start_idx, end_idx),
+            "positions": list(spans)
+        })
+    return components
+
+
+def extract_page_text(page, timings=None):
+    """提取单页文本（原始文本 + 表格文本），表格只解析一次
+    timings：传入字典时累加各阶段耗时（extract_text / extract_tables）
+    """
+    timings = {} if timings is None else timings
+    # 提取文本（保留原始格式，包括换行）
+    with stage_timer(timings, "extract_text"):
+        raw_text = page.extract_text() or ""
+    # 提取页面中的表格文本（如果有表格，优先按表格处理）
+    with stage_timer(timings, "extract_tables"):
+        tables = page.extract_tables()
+    table_text = ""
+    for table in tables:
+        for row in table:
+            row_text = " ".join([cell.strip() for cell in row if cell and cell.strip()])
+            if row_text:
+                table_text += row_text + "\n"
+    # 合并原始文本和表格文本
+    return raw_text + "\n" + table_text
+
+
+def text_hash(text):
+    """页面文本指纹"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def page_content_hash(page):
+    """页面内容指纹：内容流与表单XObject的数据（不做版面解析，代价远小于文本提取）"""
+    digest = hashlib.sha1(repr(page.page_obj.mediabox).encode("utf-8"))
+    streams = list(page.page_obj.contents)
+    xobjects = resolve1((page.page_obj.resources or {}).get("XObject")) or {}
+    for name in sorted(xobjects, key=str):
+        xobject = resolve1(xobjects[name])
+        # 图片不含文本，跳过
+        if isinstance(xobject, PDFStream) and getattr(resolve1(xobject.get("Subtype")), "name", None) != "Image":
+            streams.append(xobject)
+    for stream in streams:
+        stream = resolve1(stream)
+        if isinstance(stream, PDFStream):
+            digest.update(stream.get_data())
+    return digest.hexdigest()
+
+
+def release_page_cache(page):
+    """释放页面的解析缓存：pdfplumber页面对象缓存（字符、线条、textmap等），
+    以及pdfminer文档级的已解析对象缓存（其中包含解码后的内容流，不释放时随处理的页数一直增长）
+    """
+    page.close()
+    cached_objs = getattr(page.pdf.doc, "_cached_objs", None)
+    if cached_objs is not None:
+        cached_objs.clear()
+
 
-            # 1. 判断文本类型
-            text_type = get_text_type(line)
-            # 2. 提取当前行中的元器件
-            components = extract_components_from_text(line)
-            # 3. 构建页面元素
+def iter_page_texts(pdf, page_numbers=None):
+    """流式逐页提取已打开PDF的文本（生成器）
+    每页产出 (页码, 页面文本, 错误信息, 各阶段耗时)，处理完立即释放该页缓存的解析对象，内存不随页数增长
+    """
+    pages = pdf.pages if page_numbers is None else [pdf.pages[n - 1] for n in page_numbers]
+    for page in pages:
+        timings = {}
+        try:
+            full_text = extract_page_text(page, timings)
+        except Exception as e:
+            full_text, error = None, str(e)
+        else:
+            error = None
+        finally:
+            release_page_cache(page)
+        yield page.page_number, full_text, error, timings
+
+
+def analyze_page_text(full_text, page_num, pdf_filename):
+    """分析单页文本（提取汽车元器件和分类文本）
+    页面原文随结果返回（full_text），由process_single_pdf在处理结束时统一写入页面文本存储
+    """
+    # 过滤空行和过短文本
+    lines = [line.strip() for line in full_text.split('\n')]
+    lines = [line for line in lines if len(line) >= 2]
+    page_result = analyze_page_lines(lines, page_num)
+    page_result["text_hash"] = text_hash(full_text)
+    page_result["full_text"] = full_text
+    return page_result
+
+
+def analyze_page_lines(lines, page_num):
+    """分析单页的文本行（已去除首尾空白并过滤过短文本）"""
+    timings = {}
+    # 整页批量分析：1. 判断文本类型 2. 匹配元器件（重复文本行直接命中缓存）
+    cache_before = line_classifier.stats()
+    with stage_timer(timings, "classify"):
+        line_analyses = line_classifier.analyze_lines(lines)
+    cache_after = line_classifier.stats()
+    page_elements = []
+    with stage_timer(timings, "components"):
+        for line, (text_type, component_matches) in zip(lines, line_analyses):
+            # 提取当前行中的元器件
+            components = extract_components_from_text(line, component_matches)
+            # 构建页面元素
             page_element = {
                 "text": line,
                 "page_num": page_num,
@@ -237,21 +297,159 @@ def process_single_page(pdf_path, page_num, pdf_filename):
                 "components": components  # 关联当前行中的元器件
             }
             page_elements.append(page_element)
+    with stage_timer(timings, "ngram"):
+        ngram_postings = build_page_postings(page_elements)
+
+    return {
+        "success": True,
+        "page_elements": page_elements,
+        "page_num": page_num,
+        "component_count": len([c for elem in page_elements for c in elem["components"]]),  # 统计当前页元器件数
+        "ngram_postings": ngram_postings,  # 当前页n-gram倒排表
+        # 分类缓存命中/未命中行数（反映重复文本比例）
+        "line_cache_hits": cache_after["hits"] - cache_before["hits"],
+        "line_cache_misses": cache_after["misses"] - cache_before["misses"],
+        "timings": timings  # 各阶段耗时（秒）
+    }
+
+
+def process_page_stream(pdf, pdf_filename, page_numbers=None, known_text_hashes=None):
+    """流式处理页面：逐页产出处理结果（与process_single_page返回结构一致）
+    known_text_hashes：{页码: 上次的文本指纹}，提取出的文本未变化时跳过分类，只返回 unchanged=True
+    """
+    known_text_hashes = known_text_hashes or {}
+    for page_num, full_text, error, timings in iter_page_texts(pdf, page_numbers):
+        if error is None:
+            try:
+                page_text_hash = text_hash(full_text)
+                if known_text_hashes.get(page_num) == page_text_hash:
+                    page_result = {"success": True, "page_num": page_num, "text_hash": page_text_hash,
+                                   "unchanged": True, "full_text": full_text}
+                else:
+                    page_result = analyze_page_text(full_text, page_num, pdf_filename)
+                page_result["timings"] = merge_timings(timings, page_result.get("timings"))
+                yield page_result
+                continue
+            except Exception as e:
+                error = str(e)
+        logging.error(f"第{page_num}页处理失败：{error}")
+        yield {"success": False, "error": error, "page_num": page_num, "timings": timings}
+
+
+# 并行处理时每个工作进程持有的已打开文档
+_worker_pdf = None
+
 
-        return {
-            "success": True,
-            "page_elements": page_elements,
-            "page_num": page_num,
-            "component_count": len([c for elem in page_elements for c in elem["components"]])  # 统计当前页元器件数
-        }
+def _init_page_worker(pdf_path):
+    """工作进程初始化：每个进程只打开一次文档"""
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(pdf_path)
+
+
+def _process_page_shard(pdf_filename, page_numbers, known_text_hashes):
+    """在工作进程中处理一个页码分片"""
+    return list(process_page_stream(_worker_pdf, pdf_filename, page_numbers, known_text_hashes))
+
+
+def process_pages_parallel(pdf_path, pdf_filename, page_numbers, workers, known_text_hashes=None):
+    """多进程并行处理页面：按页码区间分片，结果按页码顺序产出
+    工作进程统一用spawn方式启动：调用方（Flask/任务队列）是多线程进程，fork后子进程可能继承其他线程持有的锁
+    """
+    shards = [page_numbers[start:start + PAGES_PER_SHARD] for start in range(0, len(page_numbers), PAGES_PER_SHARD)]
+    workers = min(workers, len(shards))
+    logging.info(f"并行处理{pdf_filename}：{len(page_numbers)}页，{len(shards)}个分片，{workers}个进程")
+    known_text_hashes = known_text_hashes or {}
+    shard_hashes = [{n: known_text_hashes[n] for n in shard if n in known_text_hashes} for shard in shards]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_page_worker, initargs=(pdf_path,)) as executor:
+        # executor.map按提交顺序返回，保证页码顺序
+        for shard_results in executor.map(_process_page_shard, [pdf_filename] * len(shards), shards, shard_hashes):
+            yield from shard_results
+
+
+def _reuse_page_result(page_num, previous_elements, reclassify):
+    """由上次索引的页面元素生成处理结果；词典/规则变化时按原文本行重新分类"""
+    if reclassify:
+        return analyze_page_lines([elem["text"] for elem in previous_elements], page_num)
+    return {
+        "success": True,
+        "page_elements": previous_elements,
+        "page_num": page_num,
+        "component_count": len([c for elem in previous_elements for c in elem["components"]]),
+        "ngram_postings": build_page_postings(previous_elements),
+        "line_cache_hits": 0,
+        "line_cache_misses": 0
+    }
+
+
+def _load_previous_index(pdf_filename):
+    """打开PDF上次生成的索引（用于增量处理），不存在或无法读取时返回None
+    JSON和二进制索引都按页读取（不加载n-gram倒排表），内存占用与页数无关；用完后须调用close
+    """
+    index_path = find_index_path(pdf_filename)
+    if not index_path:
+        return None
+    try:
+        return load_index(index_path, lazy=True)
+    except Exception as e:
+        logging.warning(f"读取旧索引失败，将全量处理：{str(e)}")
+        return None
+
+
+def _merge_page_result(result, page_result, index_writer):
+    """将单页处理结果合并到索引结构中：逐页数据立即写入index_writer，result中只保留统计与指纹"""
+    page_num = page_result["page_num"]
+    if page_result["success"]:
+        result["success_pages"] += 1
+        index_writer.add_page(page_num, page_result["page_elements"], page_result["ngram_postings"])
+        result["page_components_count"][str(page_num)] = page_result["component_count"]
+        result["total_components"] += page_result["component_count"]
+        result["page_fingerprints"][str(page_num)] = page_result["fingerprint"]
+        line_cache = result["pdf_info"].setdefault("line_cache", {"hits": 0, "misses": 0})
+        line_cache["hits"] += page_result["line_cache_hits"]
+        line_cache["misses"] += page_result["line_cache_misses"]
+        logging.info(f"第{page_num}页处理完成：{page_result['component_count']}个元器件")
+
+
+def process_single_page(pdf_path, page_num, pdf_filename):
+    """处理单页（提取汽车元器件和分类文本）
+    仅用于单独处理某一页；整本PDF请使用process_single_pdf（只打开一次文档）
+    """
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            if page_num - 1 >= len(pdf.pages):
+                raise Exception(f"页码{page_num}超出范围")
+            return next(process_page_stream(pdf, pdf_filename, [page_num]))
     except Exception as e:
         logging.error(f"第{page_num}页处理失败：{str(e)}")
         return {"success": False, "error": str(e), "page_num": page_num}
 
 
-def process_single_pdf(pdf_filename):
-    """处理PDF，生成索引（包含元器件关联信息）"""
-    start_time = time.time()
+def _sort_pages(result):
+    """按页码排序各个按页存储的字段（增量处理时页面合并顺序不固定；逐页数据由IndexWriter按页码写出）"""
+    for key in ("page_components_count", "page_fingerprints"):
+        result[key] = dict(sorted(result[key].items(), key=lambda item: int(item[0])))
+
+
+def process_single_pdf(pdf_filename, workers=None, progress_callback=None, incremental=True):
+    """处理PDF，生成索引（包含元器件关联信息）
+    workers：并行进程数，默认使用INDEX_WORKERS；页数少于PARALLEL_MIN_PAGES时自动串行
+    progress_callback：每处理完一页调用 progress_callback(已处理页数, 总页数)
+    incremental：增量处理。按页比对上次索引中的指纹：
+        - 页面内容未变且词典/规则未变：直接复用上次的页面元素
+        - 页面内容未变但词典/规则已变：不再提取文本，按上次的文本行重新分类
+        - 页面内容变化：重新提取文本；提取出的文本与上次相同时仍复用上次结果
+    各阶段耗时（打开文档、指纹、文本/表格提取、分类、元器件提取等，页面阶段为全部页面之和）
+    保存在pdf_info["timings"]中，并记录到监控指标（索引文件写入耗时只记录到监控指标）
+    内存：每页处理完立即把页面数据写入索引/页面文本的临时文件并释放解析缓存，内存占用不随页数增长；
+    本进程内存按页采样（见MemoryTracker），峰值保存在pdf_info["memory"]中；采样到的增长超过INDEX_MEMORY_LIMIT_MB时中止处理
+    （只能在某页处理完后发现，中止时内存已超过上限，单页占用过大时无法阻止）；
+    只统计本进程，不含并行处理的工作进程（每个工作进程一次只处理一个分片）
+    返回值只包含统计、指纹与处理信息（逐页数据已写入索引文件）
+    """
+    start_time = time.perf_counter()
+    doc_timings = {}
+    memory = MemoryTracker()
     pdf_path = os.path.join(PDF_DIR, pdf_filename)
     if not os.path.exists(pdf_path):
         error_msg = f"文件不存在：{pdf_filename}"
@@ -260,40 +458,158 @@ def process_single_pdf(pdf_filename):
 
     # 初始化结果结构（扩展元器件统计）
     result = {
-        "pdf_info": {"filename": pdf_filename, "status": "processing"},
+        "pdf_info": {"filename": pdf_filename, "status": "processing", "rules_version": RULES_VERSION},
         "total_pages": 0,
         "success_pages": 0,
         "total_components": 0,  # 总元器件数
         "page_components_count": {},  # 每页元器件数：{页码: 数量}
-        "page_elements": {}  # 核心：{页码: 页面元素列表}
+        # 核心：page_elements {页码: 页面元素列表}，ngram_index.pages 按页n-gram倒排表 {页码: {n-gram: [元素序号]}}
+        # 两者由IndexWriter逐页写入索引文件，不保存在result中
+        "ngram_index": {"n": NGRAM_SIZE},
+        "page_fingerprints": {}  # 每页指纹：{页码: {"content_hash", "text_hash", "rules_version"}}
     }
 
+    index_writer = text_writer = close_previous = None
     try:
-        # 获取PDF总页数
-        with pdfplumber.open(pdf_path) as pdf:
+        workers = INDEX_WORKERS if workers is None else workers
+        previous = _load_previous_index(pdf_filename) if incremental else None
+        previous_fingerprints = previous.get("page_fingerprints", {}) if previous else {}
+        previous_pages = previous.get("page_elements", {}) if previous else {}
+        # 旧索引为内存映射，写入新索引前关闭
+        close_previous = getattr(previous, "close", None)
+        previous = None
+        page_stats = {"reused": 0, "reclassified": 0, "extracted": 0}
+        content_hashes = {}
+        # 逐页写入：索引数据与本次提取的页面原文（复用的页面从旧的页面文本存储复制）
+        index_writer = IndexWriter(pdf_filename)
+        text_writer = PageTextWriter(pdf_filename)
+        processed_pages = 0
+
+        def merge(page_result, previous_elements=None):
+            nonlocal processed_pages
+            page_num = page_result["page_num"]
+            merge_timings(doc_timings, page_result.get("timings"))
+            if previous_elements is None:
+                previous_elements = previous_pages.get(str(page_num))
+            if "full_text" in page_result:
+                text_writer.add(page_num, page_result.pop("full_text"))
+            if page_result.get("unchanged"):
+                # 重新提取的文本与上次一致：复用上次结果
+                page_result = dict(_reuse_page_result(page_num, previous_elements, False),
+                                   text_hash=page_result["text_hash"])
+            page_result["fingerprint"] = {
+                "content_hash": content_hashes.get(page_num),
+                "text_hash": page_result.get("text_hash"),
+                "rules_version": RULES_VERSION
+            }
+            _merge_page_result(result, page_result, index_writer)
+            processed_pages += 1
+            memory.sample()
+            if INDEX_MEMORY_LIMIT_MB and memory.growth() > INDEX_MEMORY_LIMIT_MB * 1024 * 1024:
+                raise MemoryError(f"索引内存增长超过上限{INDEX_MEMORY_LIMIT_MB}MB（第{page_num}页）")
+            if progress_callback:
+                progress_callback(processed_pages, result["total_pages"])
+
+        # 整个文档只打开一次，逐页流式处理
+        with stage_timer(doc_timings, "open"):
+            pdf = pdfplumber.open(pdf_path)
             result["total_pages"] = len(pdf.pages)
-
-        # 逐页处理
-        for page_num in range(1, result["total_pages"] + 1):
-            page_result = process_single_page(pdf_path, page_num, pdf_filename)
-            if page_result["success"]:
-                result["success_pages"] += 1
-                result["page_elements"][str(page_num)] = page_result["page_elements"]
-                result["page_components_count"][str(page_num)] = page_result["component_count"]
-                result["total_components"] += page_result["component_count"]
-                logging.info(f"第{page_num}页处理完成：{page_result['component_count']}个元器件")
-
-        # 保存索引文件
-        index_path = os.path.join(INDEX_DIR, f"{pdf_filename.replace('.pdf', '')}.json")
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-
+        with pdf:
+
+            # 1. 按页比对指纹：内容未变的页面不再提取文本
+            extract_pages, known_text_hashes = [], {}
+            for page in pdf.pages:
+                page_num = page.page_number
+                try:
+                    with stage_timer(doc_timings, "fingerprint"):
+                        content_hashes[page_num] = page_content_hash(page)
+                except Exception as e:
+                    logging.warning(f"第{page_num}页内容指纹计算失败：{str(e)}")
+                finally:
+                    release_page_cache(page)
+                previous_fingerprint = previous_fingerprints.get(str(page_num))
+                if not previous_fingerprint or str(page_num) not in previous_pages:
+                    extract_pages.append(page_num)
+                    continue
+                rules_changed = previous_fingerprint.get("rules_version") != RULES_VERSION
+                if content_hashes.get(page_num) and previous_fingerprint.get("content_hash") == content_hashes[page_num]:
+                    previous_elements = previous_pages.get(str(page_num))
+                    page_result = _reuse_page_result(page_num, previous_elements, rules_changed)
+                    page_result["text_hash"] = previous_fingerprint.get("text_hash")
+                    merge(page_result, previous_elements)
+                    page_stats["reclassified" if rules_changed else "reused"] += 1
+                    continue
+                extract_pages.append(page_num)
+                if not rules_changed:
+                    known_text_hashes[page_num] = previous_fingerprint.get("text_hash")
+            page_stats["extracted"] = len(extract_pages)
+
+            # 2. 需要提取的页面：小批量直接串行处理
+            use_parallel = workers > 1 and len(extract_pages) >= PARALLEL_MIN_PAGES
+            if extract_pages and not use_parallel:
+                for page_result in process_page_stream(pdf, pdf_filename, extract_pages, known_text_hashes):
+                    merge(page_result)
+        # 大批量：多进程分片并行处理
+        if use_parallel:
+            for page_result in process_pages_parallel(pdf_path, pdf_filename, extract_pages, workers, known_text_hashes):
+                merge(page_result)
+        _sort_pages(result)
+        result["pdf_info"]["incremental"] = page_stats
+        logging.info(f"增量处理统计：复用{page_stats['reused']}页，重新分类{page_stats['reclassified']}页，"
+                     f"重新提取{page_stats['extracted']}页")
+
+        # 文本行分类缓存命中率（重复文本行占比）
+        line_cache = result["pdf_info"].get("line_cache")
+        if line_cache:
+            total_lines = line_cache["hits"] + line_cache["misses"]
+            line_cache["hit_rate"] = round(line_cache["hits"] / total_lines, 4) if total_lines else 0.0
+            logging.info(f"文本行分类缓存：共{total_lines}行，命中{line_cache['hits']}行，命中率{line_cache['hit_rate']:.1%}")
+
+        # 页面原文写入单个压缩文件（代替逐页的page_N_text.txt）
+        try:
+            with stage_timer(doc_timings, "write_page_texts"):
+                text_writer.finish(range(1, result["total_pages"] + 1))
+        except Exception as e:
+            logging.warning(f"页面文本保存失败：{str(e)}")
+        memory.sample()
+
+        # 保存索引文件（索引写入时即标记为处理成功）
         result["pdf_info"]["status"] = "success"
+        result["pdf_info"]["timings"] = {stage: round(seconds, 4) for stage, seconds in doc_timings.items()}
+        result["pdf_info"]["timings"]["total"] = round(time.perf_counter() - start_time, 4)
+        result["pdf_info"]["memory"] = memory.report()
+        # 替换索引文件前释放旧索引（Windows下无法替换已映射的文件）
+        previous_pages = {}
+        if close_previous is not None:
+            close_previous()
+        with stage_timer(doc_timings, "write_index"):
+            index_path = index_writer.finish(result)
+            catalog.update(pdf_filename, result, index_path)
+
         logging.info(
             f"PDF处理完成：{pdf_filename}，共{result['total_pages']}页，成功处理{result['success_pages']}页，提取{result['total_components']}个元器件")
+        logging.info("阶段耗时：" + "，".join(f"{stage} {seconds:.3f}s" for stage, seconds in doc_timings.items()))
+        logging.info(f"内存：起始{result['pdf_info']['memory']['rss_start_mb']}MB，"
+                     f"峰值{result['pdf_info']['memory']['rss_peak_mb']}MB")
+        for stage, count in page_stats.items():
+            INDEX_PAGES_TOTAL.inc(count, result=stage)
+        INDEX_PAGES_TOTAL.inc(result["total_pages"] - result["success_pages"], result="failed")
     except Exception as e:
         result["pdf_info"]["status"] = "failed"
         result["pdf_info"]["error"] = str(e)
         logging.error(f"PDF处理失败：{str(e)}")
-
+    finally:
+        # 处理失败时删除临时文件（已完成的写入不受影响）
+        for writer in (index_writer, text_writer):
+            if writer is not None:
+                writer.close()
+        if close_previous is not None:
+            close_previous()
+
+    memory.sample()
+    memory.stop()
+    INDEX_MEMORY_GROWTH_MB.observe(memory.growth() / (1024 * 1024))
+    for stage, seconds in doc_timings.items():
+        INDEX_STAGE_SECONDS.observe(seconds, stage=stage)
+    INDEX_DOCUMENT_SECONDS.observe(time.perf_counter() - start_time, status=result["pdf_info"]["status"])
     return result
@@ -0,0 +1,201 @@
+import os
+import re
+import zlib
+import bisect
+import shutil
+import struct
+import logging
+from config import *
+from document_store import document_store
+
+# 文件格式：文件头 + 按页码排序的偏移表 + 各页zlib压缩文本
+MAGIC = b"PDFTXT01"
+HEADER = struct.Struct("<8sI")  # 标识、页数
+ENTRY = struct.Struct("<IQII")  # 页码、数据偏移、压缩后长度、原文长度（UTF-8字节数）
+
+# 旧版逐页调试文本文件：INDEX_DIR/<PDF名>/page_N_text.txt
+LEGACY_PAGE_TEXT_PATTERN = re.compile(r"^page_(\d+)_text\.txt$")
+
+
+def get_page_text_path(pdf_filename):
+    """PDF对应的页面文本存储文件路径"""
+    return os.path.join(INDEX_DIR, f"{pdf_filename.replace('.pdf', '')}{PAGE_TEXT_EXT}")
+
+
+def _legacy_page_text_dir(pdf_filename):
+    return os.path.join(INDEX_DIR, pdf_filename.replace(".pdf", ""))
+
+
+class PageTextStore:
+    """只读的页面文本存储：打开时只读取偏移表，按页随机读取并解压"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"不支持的页面文本格式：{path}")
+            table = f.read(ENTRY.size * count)
+        self._entries = list(ENTRY.iter_unpack(table))
+        self._page_nums = [entry[0] for entry in self._entries]
+
+    def __contains__(self, page_num):
+        return self._entry(page_num) is not None
+
+    def page_numbers(self):
+        return list(self._page_nums)
+
+    def _entry(self, page_num):
+        pos = bisect.bisect_left(self._page_nums, page_num)
+        if pos < len(self._page_nums) and self._page_nums[pos] == page_num:
+            return self._entries[pos]
+        return None
+
+    def read_compressed(self, page_num):
+        """读取某页的压缩数据：(压缩数据, 原文长度)，不存在时返回None（用于增量写入时直接复制）"""
+        entry = self._entry(page_num)
+        if entry is None:
+            return None
+        _, offset, compressed_size, raw_size = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(compressed_size), raw_size
+
+    def get(self, page_num):
+        """读取某页文本，不存在时返回None"""
+        compressed = self.read_compressed(page_num)
+        if compressed is None:
+            return None
+        return zlib.decompress(compressed[0]).decode("utf-8")
+
+
+def open_page_text_store(pdf_filename):
+    """打开PDF的页面文本存储，不存在或无法读取时返回None"""
+    path = get_page_text_path(pdf_filename)
+    if not os.path.exists(path):
+        return None
+    try:
+        return PageTextStore(path)
+    except Exception as e:
+        logging.warning(f"读取页面文本存储失败 {pdf_filename}：{str(e)}")
+        return None
+
+
+def _read_legacy_page_text(pdf_filename, page_num):
+    """读取旧版逐页文本文件（去掉"=== 第N页 ==="标题行），不存在时返回None"""
+    path = os.path.join(_legacy_page_text_dir(pdf_filename), f"page_{page_num}_text.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    header = f"=== 第{page_num}页 ===\n"
+    return text[len(header):] if text.startswith(header) else text
+
+
+def _remove_legacy_page_texts(pdf_filename):
+    """删除旧版逐页文本文件（目录中只有这些文件时连同目录删除）"""
+    legacy_dir = _legacy_page_text_dir(pdf_filename)
+    if not os.path.isdir(legacy_dir):
+        return
+    filenames = os.listdir(legacy_dir)
+    if all(LEGACY_PAGE_TEXT_PATTERN.match(filename) for filename in filenames):
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+    else:
+        for filename in filenames:
+            if LEGACY_PAGE_TEXT_PATTERN.match(filename):
+                os.remove(os.path.join(legacy_dir, filename))
+
+
+class PageTextWriter:
+    """逐页写入页面文本：每页压缩后立即追加到临时文件，不在内存中保留原文
+    finish时按页码顺序写出最终的存储文件（原子替换旧文件）
+    """
+
+    def __init__(self, pdf_filename):
+        self.pdf_filename = pdf_filename
+        self.path = get_page_text_path(pdf_filename)
+        self._spool_path = self.path + ".pages.tmp"
+        self._spool = open(self._spool_path, "w+b")
+        self._pages = {}  # {页码: (临时文件偏移, 压缩后长度, 原文长度)}
+
+    def add(self, page_num, text):
+        raw = text.encode("utf-8")
+        compressed = zlib.compress(raw, PAGE_TEXT_COMPRESS_LEVEL)
+        offset = self._spool.seek(0, os.SEEK_END)
+        self._spool.write(compressed)
+        self._pages[page_num] = (offset, len(compressed), len(raw))
+
+    def _read_spooled(self, page_num):
+        offset, compressed_size, raw_size = self._pages[page_num]
+        self._spool.seek(offset)
+        return self._spool.read(compressed_size), raw_size
+
+    def finish(self, page_numbers=None):
+        """写出存储文件：page_numbers中没有写入文本的页面（增量处理时复用的页面）
+        从旧存储复制压缩数据，旧存储中也没有时尝试读取旧版逐页文本文件
+        """
+        try:
+            previous = open_page_text_store(self.pdf_filename)
+            sources = {}  # {页码: 读取压缩数据的函数}，写文件时逐页读取，不同时持有所有页面
+            sizes = {}  # {页码: (压缩后长度, 原文长度)}
+            for page_num in sorted(set(page_numbers or []) | set(self._pages)):
+                if page_num in self._pages:
+                    sources[page_num] = self._read_spooled
+                    sizes[page_num] = self._pages[page_num][1:]
+                    continue
+                entry = previous._entry(page_num) if previous else None
+                if entry is not None:
+                    sources[page_num] = previous.read_compressed
+                    sizes[page_num] = entry[2:]
+                    continue
+                text = _read_legacy_page_text(self.pdf_filename, page_num)
+                if text is None:
+                    continue
+                raw = text.encode("utf-8")
+                compressed = zlib.compress(raw, PAGE_TEXT_COMPRESS_LEVEL)
+                sources[page_num] = lambda _, data=(compressed, len(raw)): data
+                sizes[page_num] = (len(compressed), len(raw))
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(sizes)))
+                offset = HEADER.size + ENTRY.size * len(sizes)
+                for page_num, (compressed_size, raw_size) in sizes.items():
+                    f.write(ENTRY.pack(page_num, offset, compressed_size, raw_size))
+                    offset += compressed_size
+                for page_num, source in sources.items():
+                    f.write(source(page_num)[0])
+            os.replace(tmp_path, self.path)
+        finally:
+            self.close()
+        _remove_legacy_page_texts(self.pdf_filename)
+        return self.path
+
+    def close(self):
+        """关闭并删除临时文件（处理失败时调用，不影响旧文件）"""
+        if not self._spool.closed:
+            self._spool.close()
+        if os.path.exists(self._spool_path):
+            os.remove(self._spool_path)
+
+
+def write_page_texts(pdf_filename, page_texts, page_numbers=None):
+    """一次性写入整个文档的页面文本（压缩后按页码排序，原子替换旧文件）
+    page_texts：{页码: 文本}；page_numbers中未提供文本的页面（增量处理时复用的页面）
+    从旧存储复制压缩数据，旧存储中也没有时尝试读取旧版逐页文本文件
+    """
+    writer = PageTextWriter(pdf_filename)
+    for page_num, text in page_texts.items():
+        writer.add(page_num, text)
+    return writer.finish(page_numbers)
+
+
+def read_page_text(pdf_filename, page_num):
+    """读取PDF某一页的文本（优先页面文本存储，其次旧版逐页文本文件），不存在时返回None
+    内容重复的文档（别名）读取其规范文档的页面文本
+    """
+    pdf_filename = document_store.canonical(pdf_filename)
+    store = open_page_text_store(pdf_filename)
+    if store is not None and page_num in store:
+        return store.get(page_num)
+    return _read_legacy_page_text(pdf_filename, page_num)
@@ -0,0 +1,129 @@
+import os
+import threading
+import pypdfium2 as pdfium
+from config import *
+from cache_utils import DiskCache
+from document_store import document_store
+
+# PDFium不支持多线程并发调用，所有文档操作串行执行
+_pdfium_lock = threading.Lock()
+
+
+class PageSliceCache:
+    """按需把PDF的单页/连续几页切成独立的小PDF，并缓存在磁盘上
+    查看页面跳转搜索结果时只需下载结果所在页，不必加载整个文档
+    缓存键为PDF内容哈希：文件被替换后不会读到旧切片，内容相同的文档共用切片
+    """
+
+    def __init__(self, cache_dir=PAGE_CACHE_DIR, max_mb=PAGE_CACHE_MAX_MB):
+        self.cache = DiskCache(cache_dir, max_mb * 1024 * 1024, suffix=".pdf")
+
+    def get_slice(self, pdf_filename, first_page, last_page=None):
+        """返回包含first_page~last_page（从1开始，含两端）的PDF切片文件路径
+        页码超出范围时抛出ValueError，PDF不存在时抛出FileNotFoundError
+        """
+        last_page = first_page if last_page is None else last_page
+        if first_page < 1 or last_page < first_page:
+            raise ValueError(f"无效的页码范围：{first_page}-{last_page}")
+        if last_page - first_page + 1 > PAGE_SLICE_MAX_PAGES:
+            raise ValueError(f"一次最多获取{PAGE_SLICE_MAX_PAGES}页")
+
+        pdf_path = os.path.join(PDF_DIR, os.path.basename(pdf_filename))
+        if not pdf_filename.lower().endswith(".pdf") or not os.path.isfile(pdf_path):
+            raise FileNotFoundError(pdf_filename)
+        key = (document_store.content_hash(os.path.basename(pdf_filename)), first_page, last_page)
+
+        def create(tmp_path):
+            with _pdfium_lock:
+                source = pdfium.PdfDocument(pdf_path)
+                try:
+                    if last_page > len(source):
+                        raise ValueError(f"页码超出范围（共{len(source)}页）：{last_page}")
+                    target = pdfium.PdfDocument.new()
+                    try:
+                        target.import_pages(source, list(range(first_page - 1, last_page)))
+                        target.save(tmp_path)
+                    finally:
+                        target.close()
+                finally:
+                    source.close()
+
+        return self.cache.get_or_create(key, create)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class PageThumbnailCache:
+    """PDF页面的低分辨率缩略图（PNG），按需渲染（或处理完成后预先渲染）并缓存在磁盘上
+    搜索结果旁直接显示所在页的缩略图，不必逐条在查看器中打开
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_mb=THUMBNAIL_CACHE_MAX_MB, width=THUMBNAIL_WIDTH):
+        self.cache = DiskCache(cache_dir, max_mb * 1024 * 1024, suffix=".png")
+        self.width = width
+
+    def _key(self, content_hash, page_num):
+        return (content_hash, page_num, self.width)
+
+    def _render(self, document, page_num, tmp_path):
+        """渲染一页缩略图（调用方已打开文档；每页单独持锁，预渲染时不长时间阻塞其他请求）"""
+        with _pdfium_lock:
+            if page_num > len(document):
+                raise ValueError(f"页码超出范围（共{len(document)}页）：{page_num}")
+            page = document[page_num - 1]
+            try:
+                bitmap = page.render(scale=self.width / page.get_width())
+                image = bitmap.to_pil()
+            finally:
+                page.close()
+        image.save(tmp_path, "PNG", optimize=True)
+
+    def get_thumbnail(self, pdf_filename, page_num):
+        """返回某页缩略图文件路径（页码从1开始）
+        页码超出范围时抛出ValueError，PDF不存在时抛出FileNotFoundError
+        """
+        if page_num < 1:
+            raise ValueError(f"无效的页码：{page_num}")
+        pdf_path = os.path.join(PDF_DIR, os.path.basename(pdf_filename))
+        if not pdf_filename.lower().endswith(".pdf") or not os.path.isfile(pdf_path):
+            raise FileNotFoundError(pdf_filename)
+        key = self._key(document_store.content_hash(os.path.basename(pdf_filename)), page_num)
+
+        def create(tmp_path):
+            with _pdfium_lock:
+                document = pdfium.PdfDocument(pdf_path)
+            try:
+                self._render(document, page_num, tmp_path)
+            finally:
+                with _pdfium_lock:
+                    document.close()
+
+        return self.cache.get_or_create(key, create)
+
+    def prerender(self, pdf_filename):
+        """预先生成整个文档所有页面的缩略图（已缓存的页面跳过），返回新生成的页数"""
+        pdf_path = os.path.join(PDF_DIR, pdf_filename)
+        content_hash = document_store.content_hash(pdf_filename)
+        with _pdfium_lock:
+            document = pdfium.PdfDocument(pdf_path)
+            total_pages = len(document)
+        rendered = 0
+        try:
+            for page_num in range(1, total_pages + 1):
+                key = self._key(content_hash, page_num)
+                if not os.path.exists(self.cache.path_for(key)):
+                    self.cache.get_or_create(key, lambda tmp_path: self._render(document, page_num, tmp_path))
+                    rendered += 1
+        finally:
+            with _pdfium_lock:
+                document.close()
+        return rendered
+
+    def stats(self):
+        return self.cache.stats()
+
+
+# 全局实例
+page_slice_cache = PageSliceCache()
+page_thumbnail_cache = PageThumbnailCache()
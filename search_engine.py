@@ -1,10 +1,17 @@
 import os
-import re
-import json
+import heapq
 import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import *
 from synonym_handler import SynonymHandler
-from special_circuit_data import SPECIAL_COMPONENT_TO_PAGES, SPECIAL_CIRCUIT_COMPONENTS
+from cache_utils import LRUCache
+from highlighter import highlighter
+from metrics import stage_timer, SEARCH_SECONDS, SEARCH_STAGE_SECONDS, SEARCH_CACHE_TOTAL
+from index_cache import index_cache, get_index_path, list_indexed_pdfs
+from document_store import document_store
+from ngram_index import NgramIndex
+from special_datasets import SPECIAL_DATASETS, get_special_dataset
 
 # 配置日志
 logging.basicConfig(
@@ -28,6 +35,23 @@ class SearchEngine:
         }
         # 额外加分项（精准匹配元器件名称）
         self.exact_match_bonus = 1.5
+        # 全库搜索线程池（各文档并发搜索）
+        self._executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="pdf-search")
+        # 搜索结果缓存：键为（规范文档文件名, 索引版本, 规范化关键词），索引重写时随索引缓存一起失效
+        self.result_cache = LRUCache(QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        index_cache.add_listener(self.invalidate_results)
+
+    def invalidate_results(self, pdf_filename):
+        """清除指定PDF的全部缓存搜索结果"""
+        self.result_cache.pop_where(lambda key: key[0] == pdf_filename)
+
+    def cache_stats(self):
+        """搜索相关缓存统计（结果缓存、索引缓存、同义词扩展缓存）"""
+        return {
+            "query_results": self.result_cache.stats(),
+            "indexes": index_cache.stats(),
+            "synonyms": self.synonym_handler.cache_info()
+        }
 
     def _calculate_relevance(self, text_type, is_exact_component_match):
         """计算相关度分数"""
@@ -37,28 +61,51 @@ class SearchEngine:
             base_weight *= self.exact_match_bonus
         return round(base_weight, 1)
 
-    def _search_special_pdf(self, keyword):
-        """搜索特定PDF（陕汽轩德翼3电路图）的处理逻辑"""
+    def _search_special_pdf(self, dataset, keyword, timings):
+        """搜索特定PDF（如陕汽轩德翼3电路图）的处理逻辑：按预置的元器件-页码数据集匹配"""
         if not keyword:
             return {"results": [], "total": 0, "search_terms": []}
 
         keyword = keyword.strip()
-        search_terms = [keyword] + self.synonym_handler.get_synonyms(keyword)
+        with stage_timer(timings, "synonyms"):
+            search_terms = [keyword] + self.synonym_handler.get_synonyms(keyword)
         search_terms = [term.strip() for term in search_terms if term.strip()]
         search_terms = list(set(search_terms))  # 去重
 
+        with stage_timer(timings, "candidates"):
+            results = self._match_special_components(dataset, search_terms)
+
+        # 去重（同一页面同一术语的匹配只保留一个）
+        seen = set()
+        unique_results = []
+        for result in results:
+            key = (result["page_num"], result["matched_term"], result["full_text"])
+            if key not in seen:
+                seen.add(key)
+                unique_results.append(result)
+
+        # 排序：按相关度降序，再按页码升序
+        unique_results.sort(key=lambda x: (-x["relevance_score"], x["page_num"]))
+
+        return {
+            "results": unique_results,
+            "total": len(unique_results),
+            "search_terms": search_terms
+        }
+
+    @staticmethod
+    def _match_special_components(dataset, search_terms):
+        """在特定PDF的元器件数据集中查找搜索词（精确匹配，或通过子串索引模糊匹配）"""
         results = []
         # 检查每个搜索词是否在特定元器件列表中
         for term in search_terms:
             # 精确匹配
-            if term in SPECIAL_COMPONENT_TO_PAGES:
-                pages = SPECIAL_COMPONENT_TO_PAGES[term]
+            if term in dataset.component_to_pages:
+                pages = dataset.component_to_pages[term]
                 for page_num in pages:
-                    # 查找该页上的所有元器件作为上下文
-                    page_components = SPECIAL_CIRCUIT_COMPONENTS.get(page_num, [])
-                    context = ", ".join(page_components[:5])  # 取前5个作为上下文
-                    if len(page_components) > 5:
-                        context += ", ..."
+                    # 该页上的所有元器件，及预先生成的上下文（前5个）
+                    page_components = dataset.page_components.get(page_num, [])
+                    context = dataset.page_context(page_num)
 
                     results.append({
                         "page_num": page_num,
@@ -70,150 +117,269 @@ class SearchEngine:
                         "components_in_text": page_components
                     })
 
-            # 模糊匹配（术语包含在元器件名称中）
+            # 模糊匹配（术语包含在元器件名称中，通过子串索引查找）
             else:
-                for component, pages in SPECIAL_COMPONENT_TO_PAGES.items():
-                    if term in component:
-                        for page_num in pages:
-                            page_components = SPECIAL_CIRCUIT_COMPONENTS.get(page_num, [])
-                            context = ", ".join(page_components[:5])
-                            if len(page_components) > 5:
-                                context += ", ..."
-
-                            results.append({
-                                "page_num": page_num,
-                                "text_type": "component_desc",
-                                "relevance_score": 3.0,
-                                "matched_term": term,
-                                "highlighted_text": f"{component}（包含<mark>{term}</mark>） - 该页还包含: {context}",
-                                "full_text": f"{component} 位于第{page_num}页",
-                                "components_in_text": page_components
-                            })
+                for component in dataset.components_containing(term):
+                    for page_num in dataset.component_to_pages[component]:
+                        page_components = dataset.page_components.get(page_num, [])
+                        context = dataset.page_context(page_num)
 
-        # 去重（同一页面同一术语的匹配只保留一个）
-        seen = set()
-        unique_results = []
-        for result in results:
-            key = (result["page_num"], result["matched_term"], result["full_text"])
-            if key not in seen:
-                seen.add(key)
-                unique_results.append(result)
+                        results.append({
+                            "page_num": page_num,
+                            "text_type": "component_desc",
+                            "relevance_score": 3.0,
+                            "matched_term": term,
+                            "highlighted_text": f"{component}（包含<mark>{term}</mark>） - 该页还包含: {context}",
+                            "full_text": f"{component} 位于第{page_num}页",
+                            "components_in_text": page_components
+                        })
+        return results
 
-        # 排序：按相关度降序，再按页码升序
-        unique_results.sort(key=lambda x: (-x["relevance_score"], x["page_num"]))
+    def _find_candidates(self, pdf_filename, pdf_index, search_terms):
+        """可能匹配检索词的页面元素位置 [(页码, 元素序号)]，按页码、元素顺序
+        检索词无法使用倒排索引（如单字检索）时返回None，由调用方全量遍历
+        """
+        # 合并后的倒排索引随索引缓存；缓存的索引数据中不再保留按页倒排表
+        ngram_index = index_cache.get_attachment(
+            pdf_filename, "ngram_index", lambda data: NgramIndex.from_index(data, release_pages=True),
+            data=pdf_index)
+        if ngram_index is not None:
+            return ngram_index.candidates_for_terms(search_terms)
+        # 索引超过缓存上限未被缓存：直接用索引中的按页倒排表，不为单次查询合并
+        return NgramIndex.candidates_from_index(pdf_index, search_terms)
 
+    @staticmethod
+    def _iter_elements(pdf_index, candidates):
+        """按页码、元素顺序产出 (页码, 元素)：candidates为None时遍历全部元素，否则只取候选元素"""
+        page_elements = pdf_index.get("page_elements", {})
+        if candidates is None:
+            for page_num_str, elements in page_elements.items():
+                for elem in elements:
+                    yield int(page_num_str), elem
+            return
+        for page_num, elem_idx in candidates:
+            yield page_num, page_elements[str(page_num)][elem_idx]
+
+    @staticmethod
+    def _rank_key(result, seq):
+        """排序键：相关度降序、页码升序，同分同页按匹配顺序"""
+        return (-result["relevance_score"], result["page_num"], seq)
+
+    @staticmethod
+    def highlight_results(results, search_terms):
+        """为结果生成高亮文本（只处理实际返回的结果；特定PDF的结果自带高亮文本）"""
+        return [
+            result if "highlighted_text" in result
+            else dict(result, highlighted_text=highlighter.highlight(result["full_text"], search_terms))
+            for result in results
+        ]
+
+    def _paginate(self, matches, limit=None, offset=0, highlight=True, timings=None):
+        """从去重后的匹配项中取排序后的一页结果（limit为None时返回offset之后的全部）
+        只需前offset+limit条时用堆选择，避免对全部匹配项排序；highlight为True时为本页结果生成高亮文本
+        """
+        timings = {} if timings is None else timings
+        ranked = matches["ranked"]
+        offset = max(0, offset or 0)
+        with stage_timer(timings, "rank"):
+            if limit is None:
+                page = sorted(ranked)[offset:]
+            else:
+                page = heapq.nsmallest(offset + max(0, limit), ranked)[offset:]
+        results = [result for _, result in page]
+        if highlight:
+            with stage_timer(timings, "highlight"):
+                results = self.highlight_results(results, matches["search_terms"])
         return {
-            "results": unique_results,
-            "total": len(unique_results),
-            "search_terms": search_terms
+            "results": results,
+            "total": len(ranked),
+            "search_terms": matches["search_terms"],
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + len(results) < len(ranked)
         }
 
-    def search_in_pdf(self, pdf_filename, keyword):
-        """搜索指定PDF中的关键词（包含特定PDF的特殊处理）"""
-        # 检查是否为特定PDF（陕汽轩德翼3电路图）
-        if pdf_filename == SPECIAL_PDF_IDENTIFIER:
-            return self._search_special_pdf(keyword)
+    def _cached_matches(self, cache_key):
+        """读取缓存的匹配项，并记录命中/未命中"""
+        matches = self.result_cache.get(cache_key)
+        SEARCH_CACHE_TOTAL.inc(result="hit" if matches is not None else "miss")
+        return matches
+
+    def search_in_pdf(self, pdf_filename, keyword, limit=None, offset=0, highlight=True):
+        """搜索指定PDF中的关键词（包含特定PDF的特殊处理）
+        返回按相关度排序的第offset条起的limit条结果（limit为None时返回全部），total为去重后的总匹配数；
+        highlight为False时不生成highlighted_text（调用方不需要或稍后自行高亮）
+        """
+        timings = {}
+        with SEARCH_SECONDS.time(scope="pdf"):
+            result = self._search_in_pdf(pdf_filename, keyword, limit, offset, highlight, timings)
+        for stage, seconds in timings.items():
+            SEARCH_STAGE_SECONDS.observe(seconds, scope="pdf", stage=stage)
+        return result
+
+    def _search_in_pdf(self, pdf_filename, keyword, limit, offset, highlight, timings):
+        # 检查是否为特定PDF（如陕汽轩德翼3电路图）
+        dataset = get_special_dataset(pdf_filename)
+        if dataset is not None:
+            cache_key = (pdf_filename, "builtin", (keyword or "").strip())
+            matches = self._cached_matches(cache_key)
+            if matches is None:
+                special_result = self._search_special_pdf(dataset, keyword, timings)
+                # 特定PDF的结果已排好序，按原顺序作为排序键
+                matches = {
+                    "ranked": [((seq,), result) for seq, result in enumerate(special_result["results"])],
+                    "search_terms": special_result["search_terms"]
+                }
+                self.result_cache.put(cache_key, matches)
+            return self._paginate(matches, limit, offset, highlight, timings)
 
         # 普通PDF的搜索逻辑
         if not keyword or not pdf_filename:
             return {"results": [], "total": 0}
 
-        # 1. 加载PDF索引文件
-        index_path = os.path.join(INDEX_DIR, f"{pdf_filename.replace('.pdf', '')}.json")
-        if not os.path.exists(index_path):
-            logging.warning(f"未找到索引文件：{index_path}")
-            return {"results": [], "total": 0}
-
+        # 1. 加载PDF索引（进程内缓存，索引文件变化时自动重新加载）
         try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                pdf_index = json.load(f)
+            with stage_timer(timings, "load_index"):
+                pdf_index, index_version = index_cache.get_versioned(pdf_filename)
         except Exception as e:
             logging.error(f"加载索引失败：{str(e)}")
             return {"results": [], "total": 0}
+        if pdf_index is None:
+            logging.warning(f"未找到索引文件：{get_index_path(pdf_filename)}")
+            return {"results": [], "total": 0}
 
-        # 2. 处理关键词（包含同义词）
+        # 命中结果缓存时直接分页返回（匹配不区分大小写，关键词按小写规范化）
+        # 内容重复的文档（别名）与规范文档共用缓存条目，重新处理规范文档时一起失效
         keyword = keyword.strip()
-        all_search_terms = [keyword] + self.synonym_handler.get_synonyms(keyword)
+        cache_key = (document_store.canonical(pdf_filename), index_version, keyword.lower())
+        matches = self._cached_matches(cache_key)
+        if matches is not None:
+            return self._paginate(matches, limit, offset, highlight, timings)
+
+        # 2. 处理关键词（包含同义词）
+        with stage_timer(timings, "synonyms"):
+            all_search_terms = [keyword] + self.synonym_handler.get_synonyms(keyword)
         all_search_terms = [term.strip().lower() for term in all_search_terms if term.strip()]
         all_search_terms = list(set(all_search_terms))  # 去重
         logging.info(f"搜索关键词及同义词：{all_search_terms}")
 
-        # 3. 遍历页面元素搜索匹配
-        search_results = []
-        page_elements = pdf_index.get("page_elements", {})
+        # 3. 通过n-gram倒排索引取候选元素，再逐个校验匹配
+        with stage_timer(timings, "candidates"):
+            candidates = self._find_candidates(pdf_filename, pdf_index, all_search_terms)
+        with stage_timer(timings, "verify"):
+            best_by_page_term = self._verify_matches(self._iter_elements(pdf_index, candidates), all_search_terms)
 
-        for page_num_str, elements in page_elements.items():
-            page_num = int(page_num_str)
-            for elem in elements:
-                elem_text = elem["text"].strip()
-                elem_text_lower = elem_text.lower()
-                text_type = elem["text_type"]
-                elem_components = elem.get("components", [])
-
-                # 检查当前元素是否匹配任意搜索词
-                for term in all_search_terms:
-                    if term in elem_text_lower:
-                        # 判断是否为精准元器件匹配
-                        is_exact_component = any(comp["name"].lower() == term for comp in elem_components)
-                        # 计算相关度
-                        relevance_score = self._calculate_relevance(text_type, is_exact_component)
-                        # 提取匹配上下文（高亮关键词）
-                        highlighted_text = elem_text.replace(
-                            term, f"<mark>{term}</mark>"
-                        ) if term in elem_text else elem_text
-                        # 处理同义词高亮（如果原文本包含同义词）
-                        for syn in all_search_terms:
-                            if syn != term and syn in elem_text_lower:
-                                highlighted_text = highlighted_text.replace(
-                                    syn, f"<mark>{syn}</mark>"
-                                )
-
-                        # 添加搜索结果
-                        search_results.append({
-                            "page_num": page_num,
-                            "text_type": text_type,
-                            "relevance_score": relevance_score,
-                            "matched_term": term,  # 匹配的关键词/同义词
-                            "highlighted_text": highlighted_text,  # 高亮后的文本
-                            "full_text": elem_text,  # 完整文本
-                            "components_in_text": [comp["name"] for comp in elem_components]  # 文本中的元器件列表
-                        })
-                        break  # 一个元素匹配一个关键词即可，避免重复
+        # 4. 缓存去重后的匹配项（未排序），按需取前offset+limit条
+        matches = {
+            "ranked": list(best_by_page_term.values()),
+            "search_terms": all_search_terms  # 返回使用的搜索词（用于前端显示）
+        }
+        self.result_cache.put(cache_key, matches)
+        return self._paginate(matches, limit, offset, highlight, timings)
 
-        # 4. 排序：先按相关度降序，再按页码升序
-        search_results.sort(
-            key=lambda x: (-x["relevance_score"], x["page_num"])
-        )
+    def _verify_matches(self, elements, all_search_terms):
+        """逐个校验候选元素是否包含搜索词，返回 {(页码, 匹配词): (排序键, 结果)}
+        匹配时即去重（同一页面同一关键词只保留相关度最高的一条）
+        """
+        best_by_page_term = {}
+        for seq, (page_num, elem) in enumerate(elements):
+            elem_text = elem["text"].strip()
+            elem_text_lower = elem_text.lower()
+            text_type = elem["text_type"]
+            elem_components = elem.get("components", [])
 
-        # 5. 结果去重（同一页面同一关键词的重复匹配只保留最高相关度）
-        unique_results = []
-        seen_page_term = set()
-        for result in search_results:
-            key = (result["page_num"], result["matched_term"])
-            if key not in seen_page_term:
-                seen_page_term.add(key)
-                unique_results.append(result)
+            # 检查当前元素是否匹配任意搜索词
+            for term in all_search_terms:
+                if term in elem_text_lower:
+                    # 判断是否为精准元器件匹配
+                    is_exact_component = any(comp["name"].lower() == term for comp in elem_components)
+                    # 计算相关度
+                    relevance_score = self._calculate_relevance(text_type, is_exact_component)
+                    previous = best_by_page_term.get((page_num, term))
+                    if previous is not None and previous[1]["relevance_score"] >= relevance_score:
+                        break
 
-        return {
-            "results": unique_results,
-            "total": len(unique_results),
-            "search_terms": all_search_terms  # 返回使用的搜索词（用于前端显示）
+                    # 添加搜索结果（高亮文本在分页返回时只为本页结果生成）
+                    result = {
+                        "page_num": page_num,
+                        "text_type": text_type,
+                        "relevance_score": relevance_score,
+                        "matched_term": term,  # 匹配的关键词/同义词
+                        "full_text": elem_text,  # 完整文本
+                        "components_in_text": [comp["name"] for comp in elem_components]  # 文本中的元器件列表
+                    }
+                    best_by_page_term[(page_num, term)] = (self._rank_key(result, seq), result)
+                    break  # 一个元素匹配一个关键词即可，避免重复
+        return best_by_page_term
+
+    def _library_pdfs(self):
+        """全库搜索的文档列表：已生成索引的PDF，以及已上传的特定PDF（没有索引文件，单独加入）"""
+        pdf_filenames = list_indexed_pdfs()
+        for pdf_filename in SPECIAL_DATASETS:
+            if os.path.exists(os.path.join(PDF_DIR, pdf_filename)) and pdf_filename not in pdf_filenames:
+                pdf_filenames.append(pdf_filename)
+        return pdf_filenames
+
+    def iter_search_all(self, keyword, limit=None, highlight=True):
+        """全库并发搜索，按完成顺序逐个产出 (PDF文件名, 该文档的搜索结果)（用于流式返回）
+        limit为各文档返回的最大结果数；搜索失败的文档跳过
+        """
+        if not keyword:
+            return
+        futures = {
+            self._executor.submit(self.search_in_pdf, pdf_filename, keyword, limit, 0, highlight): pdf_filename
+            for pdf_filename in self._library_pdfs()
         }
+        for future in as_completed(futures):
+            pdf_filename = futures[future]
+            try:
+                yield pdf_filename, future.result()
+            except Exception as e:
+                logging.error(f"搜索失败 {pdf_filename}：{str(e)}")
+
+    def search_all_pdfs(self, keyword, top_k=SEARCH_TOP_K, offset=0):
+        """全库搜索：各文档并发搜索（使用缓存的索引），合并为全局排序的第offset条起的top_k条结果
+        返回：{"results": 全局结果（带pdf_filename）, "total": 总匹配数, "per_document": {PDF: 匹配数}, "search_terms": [...]}
+        """
+        timings = {}
+        with SEARCH_SECONDS.time(scope="library"):
+            result = self._search_all_pdfs(keyword, top_k, offset, timings)
+        for stage, seconds in timings.items():
+            SEARCH_STAGE_SECONDS.observe(seconds, scope="library", stage=stage)
+        return result
 
-    def search_all_pdfs(self, keyword):
-        """搜索所有PDF"""
+    def _search_all_pdfs(self, keyword, top_k, offset, timings):
         if not keyword:
-            return {}
+            return {"results": [], "total": 0, "per_document": {}, "search_terms": []}
 
-        results = {}
-        for filename in os.listdir(INDEX_DIR):
-            if filename.endswith(".json") and not filename.startswith("."):
-                pdf_filename = filename.replace(".json", ".pdf")
-                pdf_result = self.search_in_pdf(pdf_filename, keyword)
-                if pdf_result["total"] > 0:
-                    results[pdf_filename] = pdf_result
+        # 全局前offset+top_k条一定来自各文档各自的前offset+top_k条
+        offset = max(0, offset)
+        per_document = {}
+        ranked_lists = []
+        search_terms = set()
+        # 各文档先不高亮，合并截取后只为最终返回的结果生成高亮文本
+        for pdf_filename, pdf_result in self.iter_search_all(keyword, offset + top_k, highlight=False):
+            if pdf_result["total"] > 0:
+                per_document[pdf_filename] = pdf_result["total"]
+                ranked_lists.append([dict(result, pdf_filename=pdf_filename) for result in pdf_result["results"]])
+                search_terms.update(pdf_result.get("search_terms", []))
 
-        return results
+        # 各文档结果已按（相关度降序，页码升序）排好，多路归并后截取（同分同页按文件名，保证顺序稳定）
+        with stage_timer(timings, "merge"):
+            merged = heapq.merge(*ranked_lists, key=lambda x: (-x["relevance_score"], x["page_num"], x["pdf_filename"]))
+            results = list(itertools.islice(merged, offset, offset + top_k))
+        with stage_timer(timings, "highlight"):
+            results = self.highlight_results(results, search_terms)
+        total = sum(per_document.values())
+
+        return {
+            "results": results,
+            "total": total,
+            "per_document": dict(sorted(per_document.items(), key=lambda item: -item[1])),
+            "search_terms": sorted(search_terms),
+            "offset": offset,
+            "has_more": offset + len(results) < total
+        }
 
 
 # 全局实例
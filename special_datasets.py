@@ -0,0 +1,79 @@
+from config import *
+from ngram_index import text_ngrams
+from special_circuit_data import SPECIAL_CIRCUIT_COMPONENTS
+
+
+class SpecialDataset:
+    """人工整理的"元器件 -> 页码"数据集（特定PDF不解析文件，直接按此数据搜索）
+    导入时预先构建：元器件反向映射、元器件名称的子串索引（字符二元组倒排）、各页的上下文字符串
+    """
+
+    def __init__(self, pdf_filename, page_components, title="", context_size=5):
+        self.pdf_filename = pdf_filename
+        self.title = title
+        self.page_components = page_components
+        self.total_pages = len(page_components)
+        self.total_components = sum(len(components) for components in page_components.values())
+
+        # 反向映射：元器件名称 -> 页码列表（按首次出现顺序）
+        self.component_to_pages = {}
+        for page_num, components in page_components.items():
+            for component in components:
+                # 去除可能的空格并标准化
+                normalized_component = component.strip()
+                pages = self.component_to_pages.setdefault(normalized_component, [])
+                if page_num not in pages:
+                    pages.append(page_num)
+        self.component_names = list(self.component_to_pages)
+
+        # 各页上下文：该页前context_size个元器件
+        self.page_contexts = {}
+        for page_num, components in page_components.items():
+            context = ", ".join(components[:context_size])
+            if len(components) > context_size:
+                context += ", ..."
+            self.page_contexts[page_num] = context
+
+        # 子串索引：元器件名称的字符二元组 / 单字 -> 元器件序号
+        self._bigram_postings = {}
+        self._char_postings = {}
+        for component_id, component in enumerate(self.component_names):
+            for gram in text_ngrams(component, 2):
+                self._bigram_postings.setdefault(gram, set()).add(component_id)
+            for char in component:
+                self._char_postings.setdefault(char, set()).add(component_id)
+
+    def components_containing(self, term):
+        """名称包含term的元器件（按数据集中首次出现的顺序）"""
+        if not term:
+            return []
+        if len(term) >= 2:
+            posting_sets = [self._bigram_postings.get(gram, set()) for gram in text_ngrams(term, 2)]
+        else:
+            posting_sets = [self._char_postings.get(term, set())]
+        candidates = set.intersection(*posting_sets)
+        return [self.component_names[component_id] for component_id in sorted(candidates)
+                if term in self.component_names[component_id]]
+
+    def page_context(self, page_num):
+        return self.page_contexts.get(page_num, "")
+
+
+# 特定数据集注册表：{PDF文件名: SpecialDataset}
+SPECIAL_DATASETS = {}
+
+
+def register_special_dataset(pdf_filename, page_components, title=""):
+    """注册一个特定PDF的数据集（page_components: {页码: [元器件名称, ...]}）"""
+    dataset = SpecialDataset(pdf_filename, page_components, title=title)
+    SPECIAL_DATASETS[pdf_filename] = dataset
+    return dataset
+
+
+def get_special_dataset(pdf_filename):
+    """特定PDF对应的数据集；普通PDF返回None"""
+    return SPECIAL_DATASETS.get(pdf_filename)
+
+
+# 内置数据集：陕汽轩德翼3电路图
+register_special_dataset(SPECIAL_PDF_IDENTIFIER, SPECIAL_CIRCUIT_COMPONENTS, title="陕汽轩德翼3电路图")
@@ -1,9 +1,13 @@
+import os
+import json
 import logging
+from functools import lru_cache
 from config import *
+from ngram_index import text_ngrams
 
 
 class SynonymHandler:
-    def __init__(self):
+    def __init__(self, synonym_file=SYNONYM_FILE):
         # 汽车电气系统专用同义词词典（扩展版）
         self.BASE_SYNONYM_DICT = {
             # 电源类
@@ -49,36 +53,109 @@ class SynonymHandler:
             "ESC控制器": ["电子稳定控制系统控制器", "车身稳定控制单元"]
         }
         self.logger = logging.getLogger(__name__)
+        # 扩展结果缓存（按规范化后的关键词）
+        self._cached_expand = lru_cache(maxsize=SYNONYM_CACHE_SIZE)(self._expand)
+        if synonym_file and os.path.exists(synonym_file):
+            self.load_synonym_file(synonym_file)
+        else:
+            self._build_index()
+
+    def _build_index(self):
+        """由同义词词典构建检索结构：
+        - 同义词组：每个标准词与其同义词组成一组
+        - 反向映射：任一词（标准词或同义词，小写）-> 所在同义词组
+        - 子串索引：标准词（小写）的字符二元组 -> 标准词，用于模糊匹配
+        """
+        self._groups = []  # [(标准词, [同义词, ...])]
+        self._variant_to_groups = {}  # {小写词: [同义词组序号]}
+        self._key_bigrams = {}  # {字符二元组: {同义词组序号}}
+        self._key_chars = {}  # {单字: {同义词组序号}}（单字关键词的模糊匹配）
+        for key, syn_list in self.BASE_SYNONYM_DICT.items():
+            group_id = len(self._groups)
+            self._groups.append((key, list(syn_list)))
+            for variant in [key] + list(syn_list):
+                group_ids = self._variant_to_groups.setdefault(variant.strip().lower(), [])
+                if group_id not in group_ids:
+                    group_ids.append(group_id)
+            lower_key = key.lower()
+            for gram in text_ngrams(lower_key, 2):
+                self._key_bigrams.setdefault(gram, set()).add(group_id)
+            for char in lower_key:
+                self._key_chars.setdefault(char, set()).add(group_id)
+        self._cached_expand.cache_clear()
+
+    def load_synonym_file(self, path):
+        """从外部文件加载同义词并合并到词典（JSON或"标准词: 同义词1, 同义词2"格式的文本）"""
+        if path.lower().endswith(".json"):
+            with open(path, 'r', encoding='utf-8') as f:
+                extra = json.load(f)
+        else:
+            extra = {}
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    key, _, syns = line.replace("：", ":").partition(":")
+                    extra[key.strip()] = [syn.strip() for syn in syns.replace("，", ",").split(",") if syn.strip()]
+        for key, syn_list in extra.items():
+            merged = self.BASE_SYNONYM_DICT.setdefault(key, [])
+            merged.extend(syn for syn in syn_list if syn not in merged)
+        self._build_index()
+        self.logger.info(f"已加载同义词文件：{path}（{len(extra)}组）")
+
+    def _fuzzy_groups(self, lower_keyword):
+        """标准词包含关键词的同义词组（子串索引取候选，再校验）"""
+        if len(lower_keyword) >= 2:
+            posting_sets = [self._key_bigrams.get(gram, set()) for gram in text_ngrams(lower_keyword, 2)]
+        else:
+            posting_sets = [self._key_chars.get(lower_keyword, set())]
+        candidates = set.intersection(*posting_sets) if posting_sets else set()
+        return [group_id for group_id in sorted(candidates) if lower_keyword in self._groups[group_id][0].lower()]
+
+    def _expand(self, lower_keyword):
+        synonyms = set()
+        # 精确匹配：关键词是任一同义词组中的词（双向：标准词 <-> 同义词）
+        for group_id in self._variant_to_groups.get(lower_keyword, []):
+            key, syn_list = self._groups[group_id]
+            synonyms.add(key)
+            synonyms.update(syn_list)
+        # 模糊匹配（关键词包含在词典标准词中）
+        for group_id in self._fuzzy_groups(lower_keyword):
+            key, syn_list = self._groups[group_id]
+            synonyms.add(key)
+            synonyms.update(syn_list)
+        return tuple(synonyms)
 
     def get_synonyms(self, keyword):
-        """获取关键词的所有同义词（支持模糊匹配）"""
+        """获取关键词的所有同义词（支持双向匹配与模糊匹配）"""
         if not keyword:
             return []
         # 统一转为小写匹配，返回原始大小写的同义词
         lower_keyword = keyword.strip().lower()
-        synonyms = []
-        # 精确匹配关键词
-        for key, syn_list in self.BASE_SYNONYM_DICT.items():
-            if lower_keyword == key.lower():
-                synonyms.extend(syn_list)
-        # 模糊匹配（关键词包含在词典key中）
-        for key, syn_list in self.BASE_SYNONYM_DICT.items():
-            if lower_keyword in key.lower() and key not in synonyms:
-                synonyms.append(key)
-                synonyms.extend(syn_list)
-        # 去重并返回
-        return list(set(synonyms))
+        if not lower_keyword:
+            return []
+        return list(self._cached_expand(lower_keyword))
 
     def find_matched_terms(self, text, keyword):
         """查找文本中与关键词及其同义词匹配的术语"""
         if not text or not keyword:
             return []
         matched_terms = []
+        lower_text = text.lower()
         # 检查关键词本身
-        if keyword.lower() in text.lower():
+        if keyword.lower() in lower_text:
             matched_terms.append(keyword)
         # 检查所有同义词
         for synonym in self.get_synonyms(keyword):
-            if synonym.lower() in text.lower() and synonym not in matched_terms:
+            if synonym.lower() in lower_text and synonym not in matched_terms:
                 matched_terms.append(synonym)
         return matched_terms
+
+    def cache_info(self):
+        """同义词扩展缓存统计"""
+        return self._cached_expand.cache_info()._asdict()
+
+    def clear_cache(self):
+        """清空同义词扩展缓存"""
+        self._cached_expand.cache_clear()
@@ -0,0 +1,70 @@
+import os
+import sys
+import random
+import pytest
+
+# 测试直接导入项目根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index_cache
+import page_text_store
+from config import NGRAM_SIZE
+from ngram_index import build_page_postings
+
+WORDS = ["ESC关断开关", "继电器", "GND", "15A快熔", "仪表电源", "ABS", "大灯开关", "继电器盒"]
+COMPONENT_NAMES = {"ESC关断开关", "继电器", "仪表电源", "大灯开关"}
+TEXT_TYPES = ["normal_text", "component_title", "component_desc"]
+
+
+def make_element(text, page_num, text_type="normal_text"):
+    """页面元素（结构与process_single_pdf一致），元器件取文本中出现的COMPONENT_NAMES"""
+    components = []
+    for name in sorted(COMPONENT_NAMES):
+        positions = [[i, i + len(name)] for i in range(len(text)) if text.startswith(name, i)]
+        if positions:
+            components.append({"name": name, "context": text, "position": positions[0], "positions": positions})
+    return {"text": text, "page_num": page_num, "text_type": text_type, "components": components}
+
+
+def build_index(page_texts):
+    """由 {页码: [文本, ...]} 构建JSON索引数据（含按页倒排表和摘要字段）"""
+    page_elements = {
+        str(page_num): [make_element(text, page_num, TEXT_TYPES[i % len(TEXT_TYPES)]) for i, text in enumerate(texts)]
+        for page_num, texts in page_texts.items()
+    }
+    return {
+        "page_elements": page_elements,
+        "ngram_index": {"n": NGRAM_SIZE,
+                        "pages": {page_num: build_page_postings(elems) for page_num, elems in page_elements.items()}},
+        "pdf_info": {"filename": "doc.pdf", "status": "success"},
+        "total_pages": len(page_elements),
+        "total_components": sum(len(e["components"]) for elems in page_elements.values() for e in elems)
+    }
+
+
+@pytest.fixture
+def make_index():
+    """make_index({页码: [文本, ...]})"""
+    return build_index
+
+
+@pytest.fixture
+def random_index():
+    """random_index(seed, pages, max_elements)：由WORDS随机拼接文本的索引，可含空页"""
+    def build(seed, pages=12, max_elements=8):
+        rng = random.Random(seed)
+        return build_index({
+            page_num: [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+                       for _ in range(rng.randint(0, max_elements))]
+            for page_num in range(1, pages + 1)
+        })
+    return build
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """索引和页面文本写到临时目录（JSON格式）"""
+    monkeypatch.setattr(index_cache, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(index_cache, "INDEX_FORMAT", "json")
+    monkeypatch.setattr(page_text_store, "INDEX_DIR", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,67 @@
+import random
+import threading
+import index_cache
+from config import NGRAM_SIZE, BINARY_INDEX_EXT
+from binary_index import BinaryIndex, write_binary_index
+from ngram_index import NgramIndex
+
+
+def test_round_trip_matches_json_index(tmp_path, random_index):
+    index = random_index(0)
+    path = str(tmp_path / f"doc{BINARY_INDEX_EXT}")
+    write_binary_index(index, path)
+    binary = BinaryIndex(path)
+    try:
+        assert dict(binary.page_elements) == index["page_elements"]
+        for key in ("pdf_info", "total_pages", "total_components"):
+            assert binary[key] == index[key]
+        n, postings = binary.ngram_postings()
+        expected = NgramIndex.from_page_postings(NGRAM_SIZE, index["ngram_index"]["pages"])._postings
+        assert n == NGRAM_SIZE
+        assert {gram: sorted(items) for gram, items in postings.items()} == \
+            {gram: sorted(items) for gram, items in expected.items()}
+    finally:
+        binary.close()
+
+
+def test_eviction_keeps_mapping_open_for_readers(index_dir, random_index):
+    indexes = {}
+    for seed, name in enumerate(("a", "b", "c")):
+        indexes[f"{name}.pdf"] = random_index(seed)
+        write_binary_index(indexes[f"{name}.pdf"], str(index_dir / f"{name}{BINARY_INDEX_EXT}"))
+
+    cache = index_cache.IndexCache()
+    cache.get("a.pdf")
+    # 上限只容得下一个文档：多个线程交替读取不同文档，每次加载都会淘汰其他线程正在读取的索引
+    cache.max_bytes = cache.stats()["bytes"] + 1
+    errors = []
+
+    def reader(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(30):
+                pdf_filename = rng.choice(sorted(indexes))
+                binary = cache.get(pdf_filename)
+                for page_num_str, elements in indexes[pdf_filename]["page_elements"].items():
+                    assert binary.get_page_elements(page_num_str) == elements
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()["documents"] == 1
+
+    # 淘汰后仍被持有的索引可以继续读取，只有替换索引文件前的失效才关闭映射
+    held = cache.get("a.pdf")
+    cache.get("b.pdf")
+    cache.invalidate("b.pdf")
+    assert not held._mm.closed
+    held._page_cache.clear()
+    assert held.get_page_elements("1") == indexes["a.pdf"]["page_elements"]["1"]
+    current = cache.get("a.pdf")
+    cache.invalidate("a.pdf", close=True)
+    assert current._mm.closed
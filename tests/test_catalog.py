@@ -0,0 +1,34 @@
+import catalog
+import document_store
+import index_cache
+from config import BINARY_INDEX_EXT
+from binary_index import write_binary_index
+
+
+def test_alias_uses_canonical_record_and_closes_index(tmp_path, index_dir, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    store = document_store.DocumentStore(str(tmp_path / ".documents.json"))
+    monkeypatch.setattr(document_store, "PDF_DIR", str(pdf_dir))
+    monkeypatch.setattr(index_cache, "document_store", store)
+    monkeypatch.setattr(catalog, "document_store", store)
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-same")
+        store.store_pdf(str(tmp_path / name), name)
+    assert store.canonical("b.pdf") == "a.pdf"
+    write_binary_index({"page_elements": {"1": []}, "pdf_info": {"status": "success"}, "total_pages": 1},
+                       str(index_dir / f"a{BINARY_INDEX_EXT}"))
+
+    loaded = []
+
+    def load_index(path):
+        loaded.append(index_cache.load_index(path))
+        return loaded[-1]
+
+    monkeypatch.setattr(catalog, "load_index", load_index)
+    doc_catalog = catalog.Catalog(str(tmp_path / ".catalog.json"))
+    record = doc_catalog.get("b.pdf")
+    assert record["status"] == "success" and record["total_pages"] == 1
+    # 别名共用规范文档的记录，重建记录时读取的索引已关闭
+    assert doc_catalog.get("a.pdf") == record
+    assert len(loaded) == 1 and loaded[0]._mm.closed
@@ -0,0 +1,57 @@
+import html
+import random
+from highlighter import Highlighter
+
+
+def highlight_by_str_find(text, terms):
+    """连续被关键词覆盖的字符用一个<mark>包裹"""
+    marked = [False] * len(text)
+    lowered = text.lower()
+    for term in terms:
+        if not term:
+            continue
+        start = lowered.find(term.lower())
+        while start != -1:
+            for i in range(start, start + len(term)):
+                marked[i] = True
+            start = lowered.find(term.lower(), start + 1)
+    parts = []
+    i = 0
+    while i < len(text):
+        j = i
+        while j < len(text) and marked[j] == marked[i]:
+            j += 1
+        segment = html.escape(text[i:j])
+        parts.append(f"<mark>{segment}</mark>" if marked[i] else segment)
+        i = j
+    return "".join(parts)
+
+
+def test_overlapping_terms_are_merged():
+    highlighter = Highlighter()
+    assert highlighter.highlight("ABS控制器继电器", ["abs控制器", "控制", "继电器"]) == \
+        "<mark>ABS控制器继电器</mark>"
+    assert highlighter.highlight("<开关> & 开关", ["开关"]) == "&lt;<mark>开关</mark>&gt; &amp; <mark>开关</mark>"
+
+
+def test_edge_cases():
+    highlighter = Highlighter()
+    # 空文本、没有关键词、空关键词、关键词长于文本
+    assert highlighter.highlight("", ["开关"]) == ""
+    assert highlighter.highlight("<开关>", []) == "&lt;开关&gt;"
+    assert highlighter.highlight("开关", ["", "大灯开关"]) == "开关"
+    # 关键词自身重叠出现、相邻出现、跨越空格
+    assert highlighter.highlight("继电器继电器继电", ["继电器继电"]) == "<mark>继电器继电器继电</mark>"
+    assert highlighter.highlight("aaa", ["aa"]) == "<mark>aaa</mark>"
+    assert highlighter.highlight("GNDGND", ["gnd"]) == "<mark>GNDGND</mark>"
+    assert highlighter.highlight("ab ab", ["b a"]) == "a<mark>b a</mark>b"
+
+
+def test_matches_str_find_on_random_text():
+    rng = random.Random(0)
+    alphabet = "abAB<&继电器开关 "
+    highlighter = Highlighter(cache_size=8)
+    for _ in range(100):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        terms = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 4))]
+        assert highlighter.highlight(text, terms) == highlight_by_str_find(text, terms)
@@ -0,0 +1,78 @@
+import json
+import tracemalloc
+import pytest
+import index_cache
+from index_cache import IndexWriter, load_index
+
+
+def page_texts(page_num):
+    return [f"第{page_num}页 继电器{i} ESC关断开关 GND-{page_num * 100 + i} 仪表电源" for i in range(10)]
+
+
+def write_pages(make_index, page_count):
+    """逐页生成并写入page_count页的索引，返回写入期间的内存峰值（字节）"""
+    tracemalloc.start()
+    try:
+        writer = IndexWriter("doc.pdf")
+        fingerprints = {}
+        for page_num in range(1, page_count + 1):
+            page = make_index({page_num: page_texts(page_num)})
+            writer.add_page(page_num, page["page_elements"][str(page_num)], page["ngram_index"]["pages"][str(page_num)])
+            fingerprints[str(page_num)] = {"content_hash": f"{page_num:064x}", "rules_version": 1}
+        writer.finish({"pdf_info": {"status": "success"}, "total_pages": page_count,
+                       "ngram_index": {"n": 2}, "page_fingerprints": fingerprints})
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def read_previous_pages(page_count):
+    """按增量处理的方式读取旧索引的指纹和逐页元素，返回读取期间的内存峰值（字节）"""
+    tracemalloc.start()
+    try:
+        previous = load_index(index_cache.find_index_path("doc.pdf"), lazy=True)
+        try:
+            assert len(previous.get("page_fingerprints")) == page_count
+            previous_pages = previous.get("page_elements")
+            for page_num in range(1, page_count + 1):
+                assert str(page_num) in previous_pages
+                assert len(previous_pages.get(str(page_num))) == 10
+        finally:
+            previous.close()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("index_format", ["json", "binary"])
+def test_memory_does_not_grow_with_page_count(index_dir, make_index, monkeypatch, index_format):
+    monkeypatch.setattr(index_cache, "INDEX_FORMAT", index_format)
+    write_peaks, read_peaks = {}, {}
+    for page_count in (20, 160):
+        write_peaks[page_count] = write_pages(make_index, page_count)
+        read_peaks[page_count] = read_previous_pages(page_count)
+    # 页数增加到8倍，峰值只允许随指纹等摘要字段小幅增长
+    assert write_peaks[160] < write_peaks[20] * 1.5 + 256 * 1024
+    assert read_peaks[160] < read_peaks[20] * 1.5 + 256 * 1024
+
+
+def test_lazy_json_index_matches_json_load(index_dir, random_index):
+    index = random_index(0)
+    index["page_elements"]["1"].append({"text": 'a"b\\c}{][ ', "page_num": 1, "text_type": "normal_text",
+                                        "components": [], "extra": [True, None, -1.5e3, {}, []]})
+    # 旧版本写出的索引：带缩进、字段顺序不同
+    for indent, keys in ((None, list(index)), (2, list(reversed(list(index))))):
+        with open(index_dir / "doc.json", "w", encoding="utf-8") as f:
+            json.dump({key: index[key] for key in keys}, f, ensure_ascii=False, indent=indent)
+        lazy = load_index(str(index_dir / "doc.json"), lazy=True)
+        try:
+            assert dict(lazy.page_elements) == index["page_elements"]
+            assert lazy.get("total_pages") == index["total_pages"] and lazy.get("pdf_info") == index["pdf_info"]
+            assert lazy.get("ngram_index") is None and "99" not in lazy.page_elements
+        finally:
+            lazy.close()
+
+    with open(index_dir / "doc.json", "w", encoding="utf-8") as f:
+        f.write('{"page_elements": {"1": [{"text": "继电器"')
+    with pytest.raises(ValueError):
+        load_index(str(index_dir / "doc.json"), lazy=True)
@@ -0,0 +1,55 @@
+import random
+from multi_matcher import MultiPatternMatcher
+
+
+def find_all_by_str_find(patterns, text, ignore_case=True):
+    haystack = text.lower() if ignore_case else text
+    matches = []
+    for pattern in dict.fromkeys(p for p in patterns if p):
+        needle = pattern.lower() if ignore_case else pattern
+        start = haystack.find(needle)
+        while start != -1:
+            matches.append((start, start + len(needle), pattern))
+            start = haystack.find(needle, start + 1)
+    return sorted(matches)
+
+
+def test_overlapping_and_nested_patterns():
+    patterns = ["分线器", "小灯分线器", "接小灯分线器", "灯", "ABS", "abs控制器"]
+    text = "接小灯分线器与ABS控制器，abs控制器"
+    matcher = MultiPatternMatcher(patterns)
+    assert sorted(matcher.find_all(text)) == find_all_by_str_find(patterns, text)
+
+
+def test_edge_cases():
+    # 模式串自身重叠出现
+    assert sorted(MultiPatternMatcher(["继电器继电"]).find_all("继电器继电器继电")) == \
+        [(0, 5, "继电器继电"), (3, 8, "继电器继电")]
+    assert [m[0] for m in sorted(MultiPatternMatcher(["aa"]).find_all("aaaa"))] == [0, 1, 2]
+    # 空文本、空模式串、没有模式串
+    assert MultiPatternMatcher(["开关"]).find_all("") == []
+    assert MultiPatternMatcher(["", "开关"]).find_all("大灯开关") == [(2, 4, "开关")]
+    assert MultiPatternMatcher([]).find_all("大灯开关") == []
+    # 模式串长于文本、只差大小写
+    assert MultiPatternMatcher(["大灯开关继电器"]).find_all("大灯开关") == []
+    assert MultiPatternMatcher(["ABS"], ignore_case=False).find_all("abs ABS") == [(4, 7, "ABS")]
+    assert sorted(MultiPatternMatcher(["ABS"]).find_all("abs ABS")) == [(0, 3, "ABS"), (4, 7, "ABS")]
+
+
+def test_matches_str_find_on_random_text():
+    rng = random.Random(0)
+    alphabet = "abAB继电器开关灯"
+    for _ in range(50):
+        patterns = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        for ignore_case in (True, False):
+            matcher = MultiPatternMatcher(patterns, ignore_case=ignore_case)
+            assert sorted(matcher.find_all(text)) == find_all_by_str_find(patterns, text, ignore_case)
+
+
+def test_group_matches_uses_dictionary_order():
+    matcher = MultiPatternMatcher(["开关", "大灯开关", "开关"])
+    grouped = matcher.group_matches("大灯开关和开关")
+    assert list(grouped) == [0, 1]
+    assert grouped[0] == [(2, 4), (5, 7)]
+    assert grouped[1] == [(0, 4)]
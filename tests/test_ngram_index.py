@@ -0,0 +1,94 @@
+import json
+import random
+import index_cache
+from config import NGRAM_SIZE
+from ngram_index import NgramIndex
+
+
+def scan_matches(page_elements, terms):
+    return sorted(
+        (int(page_num), elem_idx)
+        for page_num, elems in page_elements.items()
+        for elem_idx, elem in enumerate(elems)
+        if any(term.lower() in elem["text"].strip().lower() for term in terms)
+    )
+
+
+def verified_candidates(candidates, page_elements, terms):
+    """倒排候选再校验子串（与搜索引擎的用法一致）"""
+    return [
+        (page_num, elem_idx) for page_num, elem_idx in candidates
+        if any(term.lower() in page_elements[str(page_num)][elem_idx]["text"].strip().lower() for term in terms)
+    ]
+
+
+def test_candidates_match_full_scan(random_index):
+    rng = random.Random(0)
+    for seed in range(10):
+        index = random_index(seed)
+        ngram_index = NgramIndex.from_index(index)
+        texts = [elem["text"] for elems in index["page_elements"].values() for elem in elems]
+        for _ in range(20):
+            # 取元素文本的片段（含跨词片段），混合大小写
+            terms = []
+            for text in rng.sample(texts, min(len(texts), rng.randint(1, 3))):
+                start = rng.randrange(len(text))
+                terms.append(text[start:start + rng.randint(NGRAM_SIZE, 6)].swapcase())
+            terms = [term for term in terms if len(term) >= NGRAM_SIZE] or ["继电"]
+            candidates = ngram_index.candidates_for_terms(terms)
+            assert verified_candidates(candidates, index["page_elements"], terms) == \
+                scan_matches(index["page_elements"], terms)
+
+
+def test_edge_case_terms(make_index):
+    index = make_index({1: ["继电器继电器", "ABS"], 2: [], 3: ["abs继电器盒", "GND"]})
+    ngram_index = NgramIndex.from_index(index)
+    page_elements = index["page_elements"]
+    # 检索词短于n（含空检索词）时无法使用倒排，回退为全量遍历
+    for terms in (["继"], [""], ["继电器", "a" * (NGRAM_SIZE - 1)]):
+        assert ngram_index.candidates_for_terms(terms) is None
+    assert ngram_index.candidates_for_terms([]) == []
+    # 检索词在元素中重叠出现、恰为n个字符、不存在的n-gram
+    for terms in (["电器继电"], ["Ab"], ["继电器盒"], ["zz"], ["器继电器继"]):
+        candidates = ngram_index.candidates_for_terms(terms)
+        assert verified_candidates(candidates, page_elements, terms) == scan_matches(page_elements, terms)
+    assert ngram_index.candidates_for_terms(["电器继电"]) == [(1, 0)]
+
+
+def test_release_pages_and_rebuild_without_postings(random_index):
+    index = random_index(3)
+    expected = NgramIndex.from_index(index)
+    released = NgramIndex.from_index(index, release_pages=True)
+    assert "pages" not in index["ngram_index"]
+    # 按页倒排表已删除时从页面元素重新构建，结果不变
+    rebuilt = NgramIndex.from_index(index)
+    for ngram_index in (released, rebuilt):
+        assert ngram_index.candidates_for_terms(["继电", "开关"]) == expected.candidates_for_terms(["继电", "开关"])
+
+
+def test_page_postings_fallback_matches_merged_index(random_index):
+    index = random_index(4)
+    ngram_index = NgramIndex.from_index(index)
+    for terms in (["继电"], ["ab", "开关"], ["继电器盒"], ["zz"], ["a"], []):
+        assert NgramIndex.candidates_from_index(index, terms) == ngram_index.candidates_for_terms(terms)
+    # 按页倒排表已并入缓存对象时无法使用
+    NgramIndex.from_index(index, release_pages=True)
+    assert NgramIndex.candidates_from_index(index, ["继电"]) is None
+
+
+def test_uncached_index_gets_no_attachment(index_dir, random_index):
+    with open(index_dir / "big.json", "w", encoding="utf-8") as f:
+        json.dump(random_index(5), f, ensure_ascii=False)
+
+    built = []
+    cache = index_cache.IndexCache(max_bytes=1)
+    data = cache.get("big.pdf")
+    assert data is not None and cache.stats()["documents"] == 0
+    # 超过上限的索引不为单次查询构建派生对象，由调用方回退到按页倒排表
+    assert cache.get_attachment("big.pdf", "ngram_index", built.append, data=data) is None
+    assert built == []
+    # 未建索引的PDF不触发失效回调
+    invalidated = []
+    cache.add_listener(invalidated.append)
+    assert cache.get_attachment("missing.pdf", "ngram_index", built.append) is None
+    assert invalidated == []
@@ -0,0 +1,44 @@
+import os
+from config import PAGE_TEXT_EXT
+from page_text_store import PageTextWriter, open_page_text_store, read_page_text, write_page_texts
+
+
+def test_round_trip(index_dir):
+    texts = {3: "第三页\nESC关断开关", 1: "", 2: "继电器 " * 1000, 10: "GND\n15A快熔"}
+    write_page_texts("doc.pdf", texts)
+    store = open_page_text_store("doc.pdf")
+    assert store.page_numbers() == [1, 2, 3, 10]
+    for page_num, text in texts.items():
+        assert read_page_text("doc.pdf", page_num) == text
+    assert read_page_text("doc.pdf", 4) is None
+    assert not any(name.endswith(".tmp") for name in os.listdir(index_dir))
+
+
+def test_incremental_write_reuses_previous_pages(index_dir):
+    write_page_texts("doc.pdf", {1: "旧1", 2: "旧2", 3: "旧3"})
+    writer = PageTextWriter("doc.pdf")
+    writer.add(2, "新2")
+    writer.add(4, "新4")
+    writer.finish(range(1, 5))
+    assert [read_page_text("doc.pdf", n) for n in range(1, 5)] == ["旧1", "新2", "旧3", "新4"]
+
+
+def test_migrates_legacy_page_files(index_dir):
+    legacy_dir = index_dir / "doc"
+    legacy_dir.mkdir()
+    for page_num in (1, 2):
+        (legacy_dir / f"page_{page_num}_text.txt").write_text(f"=== 第{page_num}页 ===\n旧版{page_num}", encoding="utf-8")
+    assert read_page_text("doc.pdf", 1) == "旧版1"
+
+    write_page_texts("doc.pdf", {2: "新2"}, page_numbers=[1, 2])
+    assert not legacy_dir.exists()
+    assert [read_page_text("doc.pdf", n) for n in (1, 2)] == ["旧版1", "新2"]
+
+
+def test_failed_write_keeps_previous_store(index_dir):
+    write_page_texts("doc.pdf", {1: "旧1"})
+    writer = PageTextWriter("doc.pdf")
+    writer.add(1, "新1")
+    writer.close()
+    assert read_page_text("doc.pdf", 1) == "旧1"
+    assert sorted(os.listdir(index_dir)) == [f"doc{PAGE_TEXT_EXT}"]
@@ -0,0 +1,57 @@
+import json
+import random
+from search_engine import search_engine, SearchEngine
+
+
+def random_matches(rng, count):
+    ranked = []
+    for seq in range(count):
+        result = {"page_num": rng.randint(1, 20), "relevance_score": rng.choice([1, 2, 3, 4.5]),
+                  "full_text": f"结果{seq}"}
+        ranked.append((SearchEngine._rank_key(result, seq), result))
+    rng.shuffle(ranked)
+    return {"ranked": ranked, "search_terms": ["结果"]}
+
+
+def test_paginate_matches_full_sort():
+    rng = random.Random(0)
+    for count in (0, 1, 7, 120):
+        matches = random_matches(rng, count)
+        expected = [result for _, result in sorted(matches["ranked"])]
+        # 含offset超出末尾、limit为0、负offset
+        for offset, limit in [(0, None), (0, 10), (7, 25), (count, 5), (count + 50, 10), (0, 0), (-3, 5)]:
+            page = search_engine._paginate(matches, limit, offset, highlight=False)
+            start = max(0, offset)
+            end = None if limit is None else start + limit
+            assert page["results"] == expected[start:end]
+            assert page["total"] == len(expected)
+            assert page["has_more"] == (start + len(page["results"]) < len(expected))
+
+
+def test_pages_concatenate_to_full_result(index_dir, random_index):
+    with open(index_dir / "paging_test.json", "w", encoding="utf-8") as f:
+        json.dump(random_index(1, pages=30, max_elements=10), f, ensure_ascii=False)
+
+    full = search_engine.search_in_pdf("paging_test.pdf", "继电器")
+    assert full["total"] > 20
+    pages, offset = [], 0
+    while True:
+        page = search_engine.search_in_pdf("paging_test.pdf", "继电器", limit=7, offset=offset)
+        pages.extend(page["results"])
+        offset += 7
+        if not page["has_more"]:
+            break
+    assert pages == full["results"]
+    past_end = search_engine.search_in_pdf("paging_test.pdf", "继电器", limit=7, offset=full["total"] + 7)
+    assert past_end["results"] == [] and past_end["total"] == full["total"] and not past_end["has_more"]
+
+
+def test_empty_and_single_character_keywords(index_dir, make_index):
+    with open(index_dir / "short_terms.json", "w", encoding="utf-8") as f:
+        json.dump(make_index({1: ["GND", "继电器"], 2: ["仪表电源 GND"]}), f, ensure_ascii=False)
+
+    for keyword in ("", "   "):
+        assert search_engine.search_in_pdf("short_terms.pdf", keyword)["total"] == 0
+    # 单字检索词短于n-gram长度，全量遍历
+    result = search_engine.search_in_pdf("short_terms.pdf", "源")
+    assert [(r["page_num"], r["full_text"]) for r in result["results"]] == [(2, "仪表电源 GND")]
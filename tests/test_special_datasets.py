@@ -0,0 +1,43 @@
+import random
+from config import SPECIAL_PDF_IDENTIFIER
+from special_datasets import SpecialDataset, get_special_dataset
+
+
+def scan_components(dataset, term):
+    return [component for component in dataset.component_names if term and term in component]
+
+
+def test_builtin_dataset_matches_full_scan():
+    dataset = get_special_dataset(SPECIAL_PDF_IDENTIFIER)
+    rng = random.Random(0)
+    terms = ["开关", "ESC", "esc", "继电器", "灯", "（", "不存在的元器件"]
+    for component in rng.sample(dataset.component_names, 20):
+        start = rng.randrange(len(component))
+        terms.append(component[start:start + rng.randint(1, 4)])
+    for term in terms:
+        assert dataset.components_containing(term) == scan_components(dataset, term)
+
+
+def test_edge_case_terms():
+    dataset = SpecialDataset("edge.pdf", {1: ["继电器继电器", "继电器", " 大灯开关 "], 2: ["继电器", "灯"]})
+    assert dataset.components_containing("") == []
+    # 单字符、重叠出现、与名称完全相同、长于所有名称、二元组都存在但不连续
+    assert dataset.components_containing("灯") == ["大灯开关", "灯"]
+    assert dataset.components_containing("器继电") == ["继电器继电器"]
+    assert dataset.components_containing("继电器") == ["继电器继电器", "继电器"]
+    assert dataset.components_containing("继电器继电器继电器") == []
+    assert dataset.components_containing("器继电器开") == []
+    assert dataset.component_to_pages["继电器"] == [1, 2]
+
+
+def test_random_dataset_matches_full_scan():
+    rng = random.Random(1)
+    alphabet = "aA继电器开关 "
+    page_components = {
+        page_num: ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))) for _ in range(rng.randint(0, 6))]
+        for page_num in range(1, 21)
+    }
+    dataset = SpecialDataset("random.pdf", page_components)
+    for _ in range(100):
+        term = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 3)))
+        assert dataset.components_containing(term) == scan_components(dataset, term)
@@ -0,0 +1,92 @@
+import io
+import os
+import hashlib
+import pytest
+import document_store
+import upload_manager
+from upload_manager import ChunkedUploadManager, UploadOffsetMismatch
+
+
+@pytest.fixture
+def pdf_dir(tmp_path, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    monkeypatch.setattr(document_store, "PDF_DIR", str(pdf_dir))
+    monkeypatch.setattr(upload_manager, "document_store",
+                        document_store.DocumentStore(str(tmp_path / ".documents.json")))
+    return pdf_dir
+
+
+def pdf_bytes(size, seed=0):
+    return b"%PDF-" + bytes((seed + i * 7) % 256 for i in range(size))
+
+
+def upload(manager, upload_id, data, chunk_size, managers=None):
+    offset = 0
+    for i, start in enumerate(range(0, len(data), chunk_size)):
+        chunk = data[start:start + chunk_size]
+        target = managers[i % len(managers)] if managers else manager
+        offset = target.append(upload_id, offset, io.BytesIO(chunk), len(chunk))
+    return offset
+
+
+def test_chunked_upload_round_trip(tmp_path, pdf_dir):
+    manager = ChunkedUploadManager(str(tmp_path / "uploads"))
+    data = pdf_bytes(250000)
+    session = manager.create("图纸.pdf", len(data))
+    assert upload(manager, session["upload_id"], data, 64 * 1024) == len(data)
+
+    stored = manager.finalize(session["upload_id"], hashlib.sha256(data).hexdigest())
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+    assert (pdf_dir / stored["filename"]).read_bytes() == data
+    assert manager.get(session["upload_id"]) is None
+
+
+def test_offset_mismatch_reports_received_bytes(tmp_path, pdf_dir):
+    manager = ChunkedUploadManager(str(tmp_path / "uploads"))
+    data = pdf_bytes(1000)
+    upload_id = manager.create("a.pdf", len(data))["upload_id"]
+    manager.append(upload_id, 0, io.BytesIO(data[:400]), 400)
+    with pytest.raises(UploadOffsetMismatch) as exc_info:
+        manager.append(upload_id, 0, io.BytesIO(data[:400]), 400)
+    assert exc_info.value.offset == 400
+    with pytest.raises(UploadOffsetMismatch):
+        manager.finalize(upload_id)
+
+
+def test_hash_matches_when_chunks_go_to_different_processes(tmp_path, pdf_dir):
+    # 两个实例共用上传目录，模拟同一上传的分块由不同工作进程接收（以及服务重启后续传）
+    upload_dir = str(tmp_path / "uploads")
+    first, second = ChunkedUploadManager(upload_dir), ChunkedUploadManager(upload_dir)
+    data = pdf_bytes(300000, seed=3)
+    upload_id = first.create("b.pdf", len(data))["upload_id"]
+    upload(first, upload_id, data, 50000, managers=[first, second])
+
+    stored = first.finalize(upload_id, hashlib.sha256(data).hexdigest())
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_rejects_wrong_hash_and_non_pdf(tmp_path, pdf_dir):
+    manager = ChunkedUploadManager(str(tmp_path / "uploads"))
+    data = pdf_bytes(1000)
+    upload_id = manager.create("c.pdf", len(data))["upload_id"]
+    upload(manager, upload_id, data, 300)
+    with pytest.raises(ValueError):
+        manager.finalize(upload_id, "0" * 64)
+
+    fake = b"not a pdf" * 10
+    upload_id = manager.create("d.pdf", len(fake))["upload_id"]
+    upload(manager, upload_id, fake, 30)
+    with pytest.raises(ValueError):
+        manager.finalize(upload_id)
+    assert os.listdir(pdf_dir) == []
+
+
+def test_duplicate_upload_becomes_alias(tmp_path, pdf_dir):
+    manager = ChunkedUploadManager(str(tmp_path / "uploads"))
+    data = pdf_bytes(5000)
+    for filename in ("原件.pdf", "副本.pdf"):
+        upload_id = manager.create(filename, len(data))["upload_id"]
+        upload(manager, upload_id, data, 2000)
+        stored = manager.finalize(upload_id)
+    assert stored["filename"] == "副本.pdf" and stored["duplicate_of"] == "原件.pdf"
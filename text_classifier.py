@@ -0,0 +1,78 @@
+import re
+from config import *
+from cache_utils import LRUCache
+
+
+def _combine_patterns(patterns):
+    """把同一类别的多条正则合并为一个预编译的交替表达式（命中任意一条即命中）"""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+class LineClassifier:
+    """文本行分类器
+    规则预编译为每个类别一个合并正则，元器件匹配复用多模式自动机；
+    相同文本行的分类结果用定长LRU缓存记忆，并统计命中率
+    """
+
+    def __init__(self, text_type_patterns, component_matcher, cache_size=LINE_CLASSIFIER_CACHE_SIZE):
+        self.component_matcher = component_matcher
+        self._title_re = _combine_patterns(text_type_patterns["component_title"])
+        self._desc_re = _combine_patterns(text_type_patterns["component_desc"])
+        self._cache = LRUCache(cache_size)
+
+    def _classify(self, text, component_matches):
+        """分类规则：component_title(元件标题) > component_desc(元件描述/表格) > normal_text(普通文本)"""
+        patterns = self.component_matcher.patterns
+        # 原文中出现的元器件（区分大小写）
+        present_components = [
+            patterns[comp_id] for comp_id, spans in component_matches.items()
+            if any(text[start:end] == patterns[comp_id] for start, end in spans)
+        ]
+
+        # 1. 判断是否为元件标题（最高优先级）
+        if self._title_re.search(text):
+            return "component_title"
+        # 额外判断：是否为明确的元器件名称（避免太短的匹配，如"开关"）
+        if any(len(comp) > 2 for comp in present_components):
+            return "component_title"
+
+        # 2. 判断是否为元件描述/表格（中优先级）
+        if self._desc_re.search(text):
+            return "component_desc"
+        # 额外判断：包含元器件名称且带描述性内容
+        if present_components and (":" in text or "→" in text or "=" in text):
+            return "component_desc"
+
+        # 3. 普通文本（低优先级）
+        return "normal_text"
+
+    def analyze(self, text):
+        """分析单行（已去除首尾空白）：返回 (文本类型, 元器件匹配结果)，结果按文本内容缓存"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+        component_matches = self.component_matcher.group_matches(text)
+        result = (self._classify(text, component_matches), component_matches)
+        self._cache.put(text, result)
+        return result
+
+    def analyze_lines(self, lines):
+        """批量分析一页的文本行，返回与输入顺序一致的 [(文本类型, 元器件匹配结果), ...]"""
+        return [self.analyze(line) for line in lines]
+
+    def classify(self, text, component_matches=None):
+        """判断单行文本类型"""
+        text = text.strip()
+        if not text:
+            return "normal_text"
+        if component_matches is None:
+            return self.analyze(text)[0]
+        return self._classify(text, component_matches)
+
+    def stats(self):
+        """分类缓存统计（命中率反映文档中重复文本的比例）"""
+        return self._cache.stats()
+
+    def clear_cache(self):
+        """清空分类结果缓存（性能测试时测量未缓存的分类耗时）"""
+        self._cache.clear()
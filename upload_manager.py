@@ -0,0 +1,219 @@
+import os
+import json
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from config import *
+from document_store import document_store
+
+# 读取请求体、重新计算哈希时每次处理的字节数
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadOffsetMismatch(ValueError):
+    """分块的起始偏移与服务端已接收的字节数不一致（客户端应从offset处续传）"""
+
+    def __init__(self, offset):
+        super().__init__(f"上传偏移不一致，服务端已接收{offset}字节")
+        self.offset = offset
+
+
+class ChunkedUploadManager:
+    """分块、可续传的PDF上传
+    流程：create 创建上传会话 -> append 按偏移顺序追加分块（直接写入磁盘并增量计算SHA-256）
+    -> finalize 校验大小/哈希后放入PDF_DIR（与已有文档内容相同时只记录别名）；连接中断后用 get 查询已接收的字节数继续上传
+    会话记录持久化到UPLOAD_DIR，服务重启后仍可续传（此时从已接收的数据重新计算哈希）
+    """
+
+    def __init__(self, upload_dir=UPLOAD_DIR):
+        self.upload_dir = upload_dir
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._upload_locks = {}  # {upload_id: 锁}，同一上传的分块串行写入
+        self._hashers = {}  # {upload_id: (已接收数据的sha256对象, 已计算的字节数)}
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.json")
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id):
+        # upload_id由uuid生成，拒绝其他格式（防止路径穿越）
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self._state_path(upload_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save(self, session):
+        """原子写入会话记录（先写临时文件再替换）"""
+        path = self._state_path(session["upload_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _received_bytes(self, upload_id):
+        try:
+            return os.path.getsize(self._data_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def _hasher(self, upload_id):
+        """已接收数据的sha256对象，调用方持有该上传的锁
+        内存中的哈希对象只在其已计算的字节数与磁盘数据一致时使用；不一致（服务重启，
+        或同一上传的分块由多个工作进程分别接收）时从磁盘数据重新计算
+        """
+        received = self._received_bytes(upload_id)
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[1] == received:
+            return cached[0]
+        hasher = hashlib.sha256()
+        if received:
+            with open(self._data_path(upload_id), 'rb') as f:
+                remaining = received
+                while remaining > 0:
+                    block = f.read(min(COPY_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        self._hashers[upload_id] = (hasher, received)
+        return hasher
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+            self._hashers.pop(upload_id, None)
+
+    def create(self, filename, total_size):
+        """创建上传会话，返回会话信息（upload_id、已接收字节数等）"""
+        filename = os.path.basename(filename or "")
+        if not filename.lower().endswith(".pdf"):
+            raise ValueError("只能上传PDF文件")
+        if total_size <= 0:
+            raise ValueError("文件大小无效")
+        if total_size > UPLOAD_MAX_MB * 1024 * 1024:
+            raise ValueError(f"文件超过{UPLOAD_MAX_MB}MB上限")
+        self.cleanup_expired()
+
+        now = time.time()
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "filename": filename,
+            "total_size": total_size,
+            "created_at": now,
+            "updated_at": now
+        }
+        open(self._data_path(session["upload_id"]), 'wb').close()
+        self._save(session)
+        logging.info(f"已创建上传会话：{filename}（{session['upload_id']}，{total_size}字节）")
+        return self.get(session["upload_id"])
+
+    def get(self, upload_id):
+        """会话信息（offset为服务端已接收的字节数），会话不存在时返回None"""
+        session = self._load(upload_id)
+        if session is None:
+            return None
+        session["offset"] = self._received_bytes(upload_id)
+        session["chunk_size"] = UPLOAD_CHUNK_SIZE
+        return session
+
+    def append(self, upload_id, offset, stream, length):
+        """把stream中的length字节追加到offset处，返回追加后的已接收字节数
+        offset与已接收字节数不一致时抛出UploadOffsetMismatch；中途断开时已写入的部分保留，可从新的偏移续传
+        """
+        session = self._load(upload_id)
+        if session is None:
+            raise FileNotFoundError(upload_id)
+        if length > UPLOAD_CHUNK_MAX_MB * 1024 * 1024:
+            raise ValueError(f"单个分块不能超过{UPLOAD_CHUNK_MAX_MB}MB")
+
+        with self._upload_lock(upload_id):
+            received = self._received_bytes(upload_id)
+            if offset != received:
+                raise UploadOffsetMismatch(received)
+            if received + length > session["total_size"]:
+                raise ValueError("分块超出文件大小")
+            hasher = self._hasher(upload_id)
+            remaining = length
+            with open(self._data_path(upload_id), 'ab') as f:
+                while remaining > 0:
+                    block = stream.read(min(COPY_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    f.write(block)
+                    hasher.update(block)
+                    remaining -= len(block)
+            self._hashers[upload_id] = (hasher, received + length - remaining)
+            session["updated_at"] = time.time()
+            self._save(session)
+            received = self._received_bytes(upload_id)
+        if remaining > 0:
+            raise UploadOffsetMismatch(received)
+        return received
+
+    def finalize(self, upload_id, expected_sha256=None):
+        """校验并完成上传：把文件放入PDF_DIR（重名时自动改名），返回 {filename, size, sha256, duplicate_of}
+        duplicate_of不为None表示与已有文档内容相同（共用其索引，不需要重新处理）
+        """
+        session = self._load(upload_id)
+        if session is None:
+            raise FileNotFoundError(upload_id)
+
+        with self._upload_lock(upload_id):
+            data_path = self._data_path(upload_id)
+            received = self._received_bytes(upload_id)
+            if received != session["total_size"]:
+                raise UploadOffsetMismatch(received)
+            sha256 = self._hasher(upload_id).hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise ValueError("文件哈希校验失败，请重新上传")
+            with open(data_path, 'rb') as f:
+                if f.read(5) != b"%PDF-":
+                    raise ValueError("文件不是有效的PDF")
+
+            stored = document_store.store_pdf(data_path, session["filename"], sha256)
+            os.remove(self._state_path(upload_id))
+        self._forget(upload_id)
+        logging.info(f"上传完成：{stored['filename']}（{received}字节，sha256={sha256}）")
+        return dict(stored, size=received)
+
+    def abort(self, upload_id):
+        """取消上传并删除已接收的数据，会话不存在时返回False"""
+        if self._load(upload_id) is None:
+            return False
+        with self._upload_lock(upload_id):
+            for path in (self._data_path(upload_id), self._state_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._forget(upload_id)
+        return True
+
+    def cleanup_expired(self, ttl=UPLOAD_SESSION_TTL):
+        """删除超过ttl秒没有新分块的上传会话，返回删除数量"""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            session = self._load(upload_id)
+            if session is not None and now - session.get("updated_at", 0) > ttl:
+                self.abort(upload_id)
+                logging.info(f"已清理过期的上传会话：{session['filename']}（{upload_id}）")
+                removed += 1
+        return removed
+
+
+# 全局实例
+upload_manager = ChunkedUploadManager()